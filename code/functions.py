@@ -108,12 +108,74 @@ def nodesize_from_pois(nnids):
 
 
 def simplify_ig(G):
-    """Simplify an igraph with ox.simplify_graph
+    """Simplify an igraph like ox.simplify_graph does, natively on its edge arrays instead of round-tripping through networkx.
+    Chains of vertices with degree 2 and two distinct neighbours are contracted into single edges between their endpoint
+    vertices, which keep their ids and attributes. Weights are summed, into both weight and length, and so are the cost
+    columns (cost_speed, cost_lts); other edge attributes become their single value or a list of their distinct values. As in osmnx, rings without any endpoint are removed and
+    a chain that returns to its endpoint becomes two self-loops, one per direction.
     """
-    G_temp = copy.deepcopy(G)
-    G_temp.es["length"] = G_temp.es["weight"]
-    output = ig.Graph.from_networkx(ox.simplify_graph(nx.MultiDiGraph(G_temp.to_networkx())).to_undirected())
-    output.es["weight"] = output.es["length"]
+    n = G.vcount()
+    edges = np.array(G.get_edgelist(), dtype = np.int64).reshape(-1, 2)
+    ends = edges.ravel() # Entry 2*e+i is end i of edge e, so entry j^1 is the other end
+    degree = np.bincount(ends, minlength = n)
+    incidence = np.argsort(ends, kind = "stable") # Entries of the vertices' incident edge ends, vertex by vertex
+    first = np.concatenate([[0], np.cumsum(degree)])[:-1]
+    interior = np.zeros(n, dtype = bool)
+    inc = np.zeros((n, 2), dtype = np.int64) # For degree 2 vertices: their two incident edge ends
+    deg2 = np.flatnonzero(degree == 2)
+    inc[deg2, 0] = incidence[first[deg2]]
+    inc[deg2, 1] = incidence[first[deg2] + 1]
+    interior[deg2] = ends[inc[deg2, 0] ^ 1] != ends[inc[deg2, 1] ^ 1] # Two distinct neighbours, which also excludes self-loops
+
+    # Walk each chain from an endpoint through the interior vertices to the next endpoint
+    summed = ["weight"] + [a for a in ("cost_speed", "cost_lts") if a in G.es.attributes()]
+    summedvalues = {a: G.es[a] for a in summed}
+    attributes = [a for a in G.es.attributes() if a not in summed + ["length"]]
+    attributevalues = {a: G.es[a] for a in attributes}
+    kept = np.flatnonzero(~interior[edges[:, 0]] & ~interior[edges[:, 1]]).tolist() if len(edges) else []
+    newedges = [(edges[e, 0], edges[e, 1]) for e in kept]
+    newattributes = {a: [attributevalues[a][e] for e in kept] for a in attributes}
+    newsums = {a: [summedvalues[a][e] for e in kept] for a in summed}
+    visited = np.zeros(len(edges), dtype = bool)
+    otherends = ends[np.arange(len(ends)) ^ 1] if len(ends) else ends
+    for j in np.flatnonzero(~interior[ends] & interior[otherends]).tolist():
+        if visited[j // 2]: continue
+        start, path = ends[j], [j // 2]
+        v, entry = ends[j ^ 1], j ^ 1
+        while interior[v]:
+            entry = inc[v, 1] if inc[v, 0] == entry else inc[v, 0] # Leave v by its other edge
+            path.append(entry // 2)
+            v, entry = ends[entry ^ 1], entry ^ 1
+        visited[path] = True
+        values = {}
+        for a in attributes:
+            pathvalues = [attributevalues[a][e] for e in path]
+            values[a] = pathvalues[0] if len(set(pathvalues)) == 1 else list(set(pathvalues))
+        if start == v: # Ring through its endpoint: osmnx walks it in both directions
+            directions = [path, path[::-1]]
+        else: # osmnx walks the chain from both ends, and the walk from the later endpoint is kept
+            directions = [path[::-1] if start < v else path]
+        for direction in directions:
+            newedges.append((start, v))
+            for a in summed:
+                newsums[a].append(sum([summedvalues[a][e] for e in direction]))
+            for a in attributes:
+                newattributes[a].append(values[a])
+
+    # Keep all non-interior vertices, interior ones are either contracted or part of a removed ring
+    keep = np.flatnonzero(~interior)
+    newindex = np.cumsum(~interior) - 1
+    newedges = newindex[np.array(newedges, dtype = np.int64).reshape(-1, 2)]
+    newedges = np.sort(newedges, axis = 1)
+    order = np.lexsort((np.arange(len(newedges)), newedges[:, 1], newedges[:, 0])).tolist()
+    vertexvalues = {a: G.vs[a] for a in G.vs.attributes()}
+    output = ig.Graph(n = len(keep), edges = newedges[order].tolist(), directed = False,
+                      vertex_attrs = {a: [values[i] for i in keep.tolist()] for a, values in vertexvalues.items()})
+    for a in summed:
+        output.es[a] = [newsums[a][i] for i in order]
+    output.es["length"] = output.es["weight"]
+    for a in attributes:
+        output.es[a] = [newattributes[a][i] for i in order]
     return output
 
 
@@ -121,10 +183,9 @@ def nxdraw(G, networktype, map_center = False, nnids = False, drawfunc = "nx.dra
     """Take an igraph graph G and draw it with a networkx drawfunc.
     """
     if simplified:
-        G.es["length"] = G.es["weight"]
-        G_nx = ox.simplify_graph(nx.MultiDiGraph(G.to_networkx())).to_undirected()
+        G_nx = ig_to_nx(simplify_ig(G))
     else:
-        G_nx = G.to_networkx()
+        G_nx = ig_to_nx(G)
     if nnids is not False: # Restrict to nnids node ids
         nnids_nx = [k for k,v in dict(G_nx.nodes(data=True)).items() if v['id'] in nnids]
         G_nx = G_nx.subgraph(nnids_nx)
@@ -197,14 +258,13 @@ def project_pos(lats, lons, map_center = False):
 
 
 def round_coordinates(G, r = 7):
-    for v in G.vs:
-        G.vs[v.index]["x"] = round(G.vs[v.index]["x"], r)
-        G.vs[v.index]["y"] = round(G.vs[v.index]["y"], r)
+    if G.vcount() == 0: return
+    G.vs["x"] = np.round(np.array(G.vs["x"], dtype = float), r).tolist()
+    G.vs["y"] = np.round(np.array(G.vs["y"], dtype = float), r).tolist()
 
 def mirror_y(G):
-    for v in G.vs:
-        y = G.vs[v.index]["y"]
-        G.vs[v.index]["y"] = -y
+    if G.vcount() == 0: return
+    G.vs["y"] = (-np.array(G.vs["y"], dtype = float)).tolist()
     
 def dist(v1, v2):
     dist = haversine((v1['y'],v1['x']),(v2['y'],v2['x']), unit="m") # x is lon, y is lat
@@ -214,45 +274,76 @@ def dist_vector(v1_list, v2_list):
     dist_list = haversine_vector(v1_list, v2_list, unit="m") # [(lat,lon)], [(lat,lon)]
     return dist_list
 
-def osm_to_ig(node, edge, weighting):
+def ig_to_nx(G):
+    """Convert the igraph graph G to networkx in bulk, from its edge list and attribute columns.
+    As with G.to_networkx, nodes are the vertex indices and keep all vertex attributes as stored
+    (id, x and the mirrored y), edges keep all edge attributes and the graph class follows from
+    directedness and multi-edges, but no _igraph_index attributes are added.
+    """
+    if G.has_multiple():
+        H = nx.MultiDiGraph() if G.is_directed() else nx.MultiGraph()
+    else:
+        H = nx.DiGraph() if G.is_directed() else nx.Graph()
+    H.graph.update({a: G[a] for a in G.attributes()})
+    def records(seq, count):
+        names = seq.attributes()
+        return [dict(zip(names, values)) for values in zip(*[seq[a] for a in names])] if names else [{} for _ in range(count)]
+    H.add_nodes_from(zip(range(G.vcount()), records(G.vs, G.vcount())))
+    edges = np.array(G.get_edgelist(), dtype = np.int64).reshape(-1, 2)
+    H.add_edges_from(zip(edges[:, 0].tolist(), edges[:, 1].tolist(), records(G.es, G.ecount())))
+    return H
+
+def nx_to_ig(G, combine_edges = max):
+    """Convert the networkx graph G to an undirected igraph graph in bulk, from its edge list and attribute columns.
+    Graphs from ig_to_nx have an id attribute on their nodes and are taken as stored. Other graphs are taken as osmnx
+    graphs: like csv_to_ig, their node keys become the vertex id, y is mirrored and weight is the length if missing.
+    As in csv_to_ig, x and y are rounded to 7 digits.
+    The multi-edges of directed graphs are combined as in csv_to_ig, weight with combine_edges and all other attributes
+    by their first value. With combine_edges None, all edges are kept.
+    """
+    nodes = list(G.nodes)
+    nodedata = [d for _, d in G.nodes(data = True)]
+    vattributes = {a: [d.get(a) for d in nodedata] for a in sorted(set().union(*nodedata))}
+    if "id" not in vattributes or None in vattributes["id"]:
+        vattributes["id"] = nodes
+        if "y" in vattributes:
+            vattributes["y"] = [-y if y is not None else None for y in vattributes["y"]]
+    for a in ["x", "y"]: # Rounded as in csv_to_ig, so that vertex_index and intersect_igraphs match the vertices
+        if a in vattributes:
+            vattributes[a] = [round(c, 7) if c is not None else None for c in vattributes[a]]
+    edgedata = list(G.edges(data = True))
+    endpoints = pd.Index(nodes).get_indexer([e[0] for e in edgedata] + [e[1] for e in edgedata]).reshape(2, -1).T
+    eattributes = {a: [e[2].get(a) for e in edgedata] for a in sorted(set().union(*[e[2] for e in edgedata]))}
+    if "weight" not in eattributes and "length" in eattributes:
+        eattributes["weight"] = eattributes["length"]
+
+    H = ig.Graph(n = len(nodes), edges = endpoints.tolist(), directed = False, graph_attrs = dict(G.graph),
+                 vertex_attrs = vattributes, edge_attrs = eattributes)
+    if G.is_directed() and combine_edges is not None:
+        H.simplify(combine_edges = {"weight": combine_edges, None: "first"})
+    return H
+
+def osm_to_ig(node, edge, weighting = None):
     """ Turns a node and edge dataframe into an igraph Graph.
+    The graph is created in one call from the edge list, with node ids mapped to vertex indices as arrays,
+    and all attributes are set as whole columns. With weighting, its cost column is attached as in csv_to_ig.
     """
-    G = ig.Graph(directed=False)
-    x_coords = node['x'].tolist() 
-    y_coords = node['y'].tolist()
     ids = node['osmid'].tolist()
-    coords = []
-
-    for i in range(len(x_coords)):
-        G.add_vertex(x=x_coords[i], y=y_coords[i], id=ids[i])
-        coords.append((x_coords[i], y_coords[i]))
-
-    id_dict = dict(zip(G.vs['id'], np.arange(0, G.vcount()).tolist()))
-    coords_dict = dict(zip(np.arange(0, G.vcount()).tolist(), coords))
-
-    edge_list = []
-    edge_info = {
-        "weight": [],
-        "osmid": [],
-        # Only include ori_length if weighting is True
-        "ori_length": [] if weighting else None  
-    }
-    
-    for i in range(len(edge)):
-        edge_list.append([id_dict.get(edge['u'][i]), id_dict.get(edge['v'][i])])
-        edge_info["weight"].append(round(edge['length'][i], 10))
-        edge_info["osmid"].append(edge['osmid'][i])
-        
-        if weighting:  # Only add ori_length if weighting is True
-            edge_info["ori_length"].append(edge['ori_length'][i])  # Store the original length
-
-    G.add_edges(edge_list)  # Add edges without attributes
-    for i in range(len(edge)):
-        G.es[i]["weight"] = edge_info["weight"][i]
-        G.es[i]["osmid"] = edge_info["osmid"][i]
-        
-        if weighting:  # Set the original length only if weighting is True
-            G.es[i]["ori_length"] = edge_info["ori_length"][i]
+    id_dict = dict(zip(ids, range(len(ids)))) # For duplicate ids, the last vertex wins
+    try:
+        u = [id_dict[i] for i in edge['u'].tolist()]
+        v = [id_dict[i] for i in edge['v'].tolist()]
+    except KeyError as err:
+        raise ValueError("Edge endpoint " + str(err) + " is not in the node table") from None
+
+    G = ig.Graph(n = len(ids), edges = list(zip(u, v)), directed = False,
+                 vertex_attrs = {"x": node['x'].tolist(), "y": node['y'].tolist(), "id": ids})
+    G.es["weight"] = np.round(edge['length'].to_numpy(dtype = float), 10).tolist()
+    G.es["osmid"] = edge['osmid'].tolist()
+    if weighting:
+        for name, cost in EdgeTable(node, edge).costs(weighting).items():
+            if name != "weight":
+                G.es[name] = np.round(cost, 10).tolist()
 
     G.simplify(combine_edges=max)
     return G
@@ -343,26 +434,135 @@ def compress_file(p, f, filetype = ".csv", delete_uncompressed = True):
         zfile.write(p + f + filetype, f + filetype)
     if delete_uncompressed: os.remove(p + f + filetype)
 
+def write_zipped_csv(df, p, f, chunksize = csvchunksize):
+    """Write the dataframe df as csv member f+'.csv' directly into the zip file p+f+'.zip'.
+    Rows are formatted and compressed in chunks, so no uncompressed csv file is ever written to disk.
+    The zip is written under a temporary name and then moved into place.
+    """
+    tmpfile = p + f + ".zip." + str(os.getpid()) + "." + str(threading.get_ident()) + ".tmp"
+    with zipfile.ZipFile(tmpfile, 'w', zipfile.ZIP_DEFLATED) as zfile:
+        with zfile.open(f + ".csv", 'w', force_zip64 = True) as zmember:
+            with io.TextIOWrapper(zmember, encoding = "utf-8", newline = "") as fcsv:
+                for start in range(0, max(len(df), 1), chunksize):
+                    df.iloc[start:start+chunksize].to_csv(fcsv, index = True, header = (start == 0))
+    os.replace(tmpfile, p + f + ".zip")
+
 def ox_to_csv(G, p, placeid, parameterid, postfix = "", compress = True, verbose = True):
-    if "crs" not in G.graph:
-        G.graph["crs"] = 'epsg:4326' # needed for OSMNX's graph_to_gdfs in utils_graph.py
-    try:
-        node, edge = ox.graph_to_gdfs(G)
-    except ValueError:
-        node, edge = gpd.GeoDataFrame(), gpd.GeoDataFrame()
+    """Write the osmnx graph G as node and edge csv files. G can also be a tuple (node, edge)
+    of GeoDataFrames as returned by ox.graph_to_gdfs, which are written as they are.
+    """
+    if isinstance(G, tuple):
+        node, edge = G
+    else:
+        if "crs" not in G.graph:
+            G.graph["crs"] = 'epsg:4326' # needed for OSMNX's graph_to_gdfs in utils_graph.py
+        try:
+            node, edge = ox.graph_to_gdfs(G)
+        except ValueError:
+            node, edge = gpd.GeoDataFrame(), gpd.GeoDataFrame()
     prefix = placeid + '_' + parameterid + postfix
 
-    node.to_csv(p + prefix + '_nodes.csv', index = True)
-    if compress: compress_file(p, prefix + '_nodes')
- 
-    edge.to_csv(p + prefix + '_edges.csv', index = True)
-    if compress: compress_file(p, prefix + '_edges')
+    if compress:
+        write_zipped_csv(node, p, prefix + '_nodes')
+        write_zipped_csv(edge, p, prefix + '_edges')
+    else:
+        node.to_csv(p + prefix + '_nodes.csv', index = True)
+        edge.to_csv(p + prefix + '_edges.csv', index = True)
 
     if verbose: print(placeid + ": Successfully wrote graph " + parameterid + postfix)
 
+def ox_to_csv_concurrent(jobs, p, placeid, compress = True, verbose = True, workers = csvwriteworkers):
+    """Write several networks of one city at the same time with ox_to_csv.
+    jobs is an iterable of (G, parameterid, postfix) tuples. Each network goes to its own files,
+    and zlib compression releases the GIL, so threads are enough and the graphs need not be copied.
+    jobs is consumed only as workers become free, so if it is a generator that builds the networks,
+    at most workers + 1 of them are in memory at once.
+    """
+    with concurrent.futures.ThreadPoolExecutor(max_workers = workers) as executor:
+        futures = set()
+        for G, parameterid, postfix in jobs:
+            if len(futures) >= workers:
+                done, futures = concurrent.futures.wait(futures, return_when = concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    future.result() # Raise any exception of the writing threads here
+            futures.add(executor.submit(ox_to_csv, G, p, placeid, parameterid, postfix, compress, verbose))
+            G = None # Only the worker keeps the network
+        for future in futures:
+            future.result()
+
+def compose_networks(Gs, compositions = networkcompositions, last = ["carall"]):
+    """Compose the networks Gs (dict of parameterid: nx.MultiDiGraph) into one union graph, and represent every
+    network, also the derived ones of compositions (like networkcompositions), as a boolean mask over the union's edges.
+    As with nx.compose, an edge in several networks keeps the attributes of the one composed last. The networks
+    in last are composed last, so carall wins as it did in nx.compose(biketrack, carall).
+    Returns the union graph, its edges as a list of (u, v, key) and the dict of masks, aligned with the edges.
+    """
+    order = [parameterid for parameterid in Gs if parameterid not in last] + [parameterid for parameterid in last if parameterid in Gs]
+    G = nx.compose_all([Gs[parameterid] for parameterid in order])
+    edges = list(G.edges(keys = True))
+    edgeindex = dict(zip(edges, range(len(edges))))
+    masks = {}
+    for parameterid, H in Gs.items():
+        masks[parameterid] = np.zeros(len(edges), dtype = bool)
+        masks[parameterid][np.array([edgeindex[e] for e in H.edges(keys = True)], dtype = np.int64)] = True
+
+    # Node pair keys of the edges, to match them like intersect_igraphs and delete_overlaps do
+    pairs = np.array([e[:2] for e in edges], dtype = np.int64).reshape(-1, 2)
+    keys = np.empty(len(edges), dtype = [("lo", np.int64), ("hi", np.int64)])
+    keys["lo"], keys["hi"] = pairs.min(axis = 1), pairs.max(axis = 1)
+    for parameterid, (operation, operands) in compositions.items():
+        mask = masks[operands[0]].copy()
+        for operand in operands[1:]:
+            if operation == "or":
+                mask |= masks[operand]
+            elif operation == "and":
+                mask &= keys_in(keys, keys[masks[operand]])
+            elif operation == "andnot":
+                mask &= ~keys_in(keys, keys[masks[operand]])
+            else:
+                raise ValueError("Unknown network composition " + str(operation) + " for " + parameterid)
+        masks[parameterid] = mask
+    return G, edges, masks
+
+def network_masks_file(p, placeid):
+    """Return the path of the file with the edge masks of all networks of placeid over their union graph, as written by 01
+    """
+    return p + placeid + '_networkmasks.npz'
+
+def write_network_masks(masks, p, placeid):
+    """Write the edge masks of compose_networks (dict of parameterid: boolean array, aligned with the rows of the
+    union edge table) into one .npz file. Like write_graph_cache, it is written to a temporary name first and then moved.
+    """
+    masksfile = network_masks_file(p, placeid)
+    tmpfile = masksfile + "." + str(os.getpid()) + ".tmp"
+    with open(tmpfile, 'wb') as f:
+        np.savez_compressed(f, **masks)
+    os.replace(tmpfile, masksfile)
+
+def network_mask(p, placeid, parameterid):
+    """Return the edge mask of the network parameterid over the union graph of placeid, or None if there is none
+    """
+    masksfile = network_masks_file(p, placeid)
+    if not os.path.isfile(masksfile):
+        return None
+    with np.load(masksfile, allow_pickle = False) as masks:
+        return masks[parameterid] if parameterid in masks.files else None
+
+def network_graph(Gs, parameterid, compositions = networkcompositions):
+    """Return the networkx graph of the network parameterid from the queried networks Gs (dict of parameterid: nx.MultiDiGraph).
+    Networks derived with "or" in compositions are composed from their operands in order, so the later ones win as in nx.compose.
+    """
+    if parameterid in Gs:
+        return Gs[parameterid]
+    operation, operands = compositions[parameterid]
+    if operation != "or":
+        raise ValueError("Network " + parameterid + " is not a union of networks")
+    return nx.compose_all([network_graph(Gs, operand, compositions) for operand in operands])
+
 def check_extract_zip(p, prefix):
     """ Check if a zip file prefix+'_nodes.zip' and + prefix+'_edges.zip'
     is available at path p. If so extract it and return True, otherwise False.
+    The graph loaders do not need this anymore, they stream the csv files out of the zip with read_zipped_csv.
     If you call this function, remember to clean up (i.e. delete the unzipped files)
     after you are done like this:
 
@@ -381,114 +581,665 @@ def check_extract_zip(p, prefix):
         return False
 
 
-def csv_to_ox(p, placeid, parameterid):
-    """ Load a networkx graph from _edges.csv and _nodes.csv
-    The edge file must have attributes u,v,osmid,length
-    The node file must have attributes y,x,osmid
-    Only these attributes are loaded.
+def graph_cache_file(p, placeid, parameterid):
+    """Return the path of the binary graph cache belonging to the zipped csv files of placeid, parameterid
+    """
+    return p + placeid + '_' + parameterid + '_graphcache.npz'
+
+
+def graph_source_files(p, placeid, parameterid):
+    """Return the existing data files of the network placeid, parameterid: the zip files if they exist, otherwise the uncompressed csv files.
+    Networks without files of their own are taken from the union graph and their edge mask (see network_mask), so these files are returned.
     """
     prefix = placeid + '_' + parameterid
-    compress = check_extract_zip(p, prefix)
-    
-    with open(p + prefix + '_edges.csv', 'r') as f:
-        header = f.readline().strip().split(",")
-
-        lines = []
-        for line in csv.reader(f, quotechar='"', delimiter=',', quoting=csv.QUOTE_ALL, skipinitialspace=True):
-            line_list = [c for c in line]
-            osmid = str(eval(line_list[header.index("osmid")])[0]) if isinstance(eval(line_list[header.index("osmid")]), list) else line_list[header.index("osmid")] # If this is a list due to multiedges, just load the first osmid
-            length = str(eval(line_list[header.index("length")])[0]) if isinstance(eval(line_list[header.index("length")]), list) else line_list[header.index("length")] # If this is a list due to multiedges, just load the first osmid
-            line_string = "" + line_list[header.index("u")] + " "+ line_list[header.index("v")] + " " + osmid + " " + length
-            lines.append(line_string)
-        G = nx.parse_edgelist(lines, nodetype = int, data = (("osmid", int),("length", float)), create_using = nx.MultiDiGraph) # MultiDiGraph is necessary for OSMNX, for example for get_undirected(G) in utils_graph.py
-    with open(p + prefix + '_nodes.csv', 'r') as f:
-        header = f.readline().strip().split(",")
-        values_x = {}
-        values_y = {}
-        for line in csv.reader(f, quotechar='"', delimiter=',', quoting=csv.QUOTE_ALL, skipinitialspace=True):
-            line_list = [c for c in line]
-            osmid = int(line_list[header.index("osmid")])
-            values_x[osmid] = float(line_list[header.index("x")])
-            values_y[osmid] = float(line_list[header.index("y")])
-
-        nx.set_node_attributes(G, values_x, "x")
-        nx.set_node_attributes(G, values_y, "y")
+    sources = [p + prefix + '_nodes.zip', p + prefix + '_edges.zip']
+    if not all([os.path.isfile(f) for f in sources]):
+        sources = [f for f in [p + prefix + '_nodes.csv', p + prefix + '_edges.csv'] if os.path.isfile(f)]
+    if not sources and parameterid != "union" and network_mask(p, placeid, parameterid) is not None:
+        sources = graph_source_files(p, placeid, "union") + [network_masks_file(p, placeid)]
+    return sources
 
-    if compress:
-        os.remove(p + prefix + '_nodes.csv')
-        os.remove(p + prefix + '_edges.csv')
-    return G
 
+def graph_cache_is_fresh(p, placeid, parameterid):
+    """Check if the binary graph cache exists and is not older than the data files it was built from.
+    The zip files are the reference if they exist, otherwise the uncompressed csv files.
+    """
+    cachefile = graph_cache_file(p, placeid, parameterid)
+    if not os.path.isfile(cachefile):
+        return False
+    sources = graph_source_files(p, placeid, parameterid)
+    if not sources:
+        return True # Only the cache is left, nothing it could be stale against
+    return os.path.getmtime(cachefile) >= max([os.path.getmtime(f) for f in sources])
 
 
-def csv_to_ox_highway(p, placeid, parameterid): #  this is a modification of the orignal csv_to_ox function to include
-    """ Load a networkx graph from _edges.csv and _nodes.csv
-    The edge file must have attributes u,v,osmid,maxspeed,highway,length
-    The node file must have attributes y,x,osmid
-    Only these attributes are loaded.
+def write_graph_cache(p, placeid, parameterid, n, e):
+    """Write the graph cache columns of the node and edge dataframes n, e into one .npz file.
+    Text columns are stored as fixed width unicode (missing values as ""), so no pickling is involved.
+    The file is written to a temporary name first and then moved, so parallel jobs never read half a cache.
+    """
+    columns = {"version": np.array(graphcache_version), "empty": np.array(n is None)}
+    if n is not None:
+        for table, df in (("nodes", n), ("edges", e)):
+            for col in graphcache_columns[table]:
+                if col not in df.columns: continue
+                if df[col].dtype == object:
+                    columns[table + "_" + col] = df[col].fillna("").astype(str).to_numpy(dtype = str)
+                else:
+                    columns[table + "_" + col] = df[col].to_numpy()
+    cachefile = graph_cache_file(p, placeid, parameterid)
+    tmpfile = cachefile + "." + str(os.getpid()) + ".tmp"
+    with open(tmpfile, 'wb') as f:
+        np.savez(f, **columns)
+    os.replace(tmpfile, cachefile)
+
+
+def read_graph_cache(p, placeid, parameterid):
+    """Read the node and edge dataframes from the binary graph cache.
+    Returns (None, None) for an empty graph. Raises ValueError if the cache has an outdated version.
     """
+    with np.load(graph_cache_file(p, placeid, parameterid), allow_pickle = False) as cache:
+        if cache["version"] != graphcache_version:
+            raise ValueError("Outdated graph cache version")
+        if cache["empty"]:
+            return None, None
+        tables = {"nodes": {}, "edges": {}}
+        for key in cache.files:
+            if key.startswith("nodes_") or key.startswith("edges_"):
+                table, col = key.split("_", 1)
+                values = cache[key]
+                if values.dtype.kind == "U": # Restore missing text values as NaN, like pd.read_csv
+                    values = pd.Series(values, dtype = object).replace("", np.nan)
+                tables[table][col] = values
+    n = pd.DataFrame(tables["nodes"], columns = [c for c in graphcache_columns["nodes"] if c in tables["nodes"]])
+    e = pd.DataFrame(tables["edges"], columns = [c for c in graphcache_columns["edges"] if c in tables["edges"]])
+    return n, e
+
+
+def read_zipped_csv(p, prefix, usecols = None):
+    """Read the csv file prefix+'.csv' into a dataframe, streaming it directly out of
+    prefix+'.zip' if that is available at path p, so nothing is extracted to disk.
+    If usecols is given, only these columns (as far as they exist) are parsed.
+    """
+    columnfilter = (lambda c: c in usecols) if usecols is not None else None
+    if os.path.isfile(p + prefix + '.zip'):
+        with zipfile.ZipFile(p + prefix + '.zip', 'r') as zfile:
+            with zfile.open(prefix + '.csv') as f:
+                return pd.read_csv(f, usecols = columnfilter)
+    return pd.read_csv(p + prefix + '.csv', usecols = columnfilter)
+
+
+def read_graph_tables(p, placeid, parameterid, columns = graphcache_columns):
+    """Load the node and edge dataframes of placeid, parameterid.
+    If usegraphcache is set, they are taken from the binary graph cache when it is fresh,
+    otherwise they are streamed from the (zipped) csv files and the cache is rebuilt.
+    Without the cache, only the given node/edge columns are read.
+    A network without files of its own is selected from the union graph of 01 with its edge mask, with the nodes its edges use.
+    Returns (None, None) if the graph is empty or does not exist.
+    """
+    if usegraphcache and graph_cache_is_fresh(p, placeid, parameterid):
+        try:
+            return read_graph_cache(p, placeid, parameterid)
+        except (ValueError, KeyError, OSError): # Outdated or broken cache, rebuild it below
+            pass
+
+    if usegraphcache: # The cache must hold all columns, whatever this loader needs
+        columns = graphcache_columns
     prefix = placeid + '_' + parameterid
-    compress = check_extract_zip(p, prefix)
-    
-    with open(p + prefix + '_edges.csv', 'r') as f:
-        header = f.readline().strip().split(",")
-
-        lines = []
-        for line in csv.reader(f, quotechar='"', delimiter=',', quoting=csv.QUOTE_ALL, skipinitialspace=True):
-            line_list = [c for c in line]
-            osmid = str(eval(line_list[header.index("osmid")])[0]) if isinstance(eval(line_list[header.index("osmid")]), list) else line_list[header.index("osmid")] # If this is a list due to multiedges, just load the first osmid
-            highway = line_list[header.index("highway")]
-            length = str(eval(line_list[header.index("length")])[0]) if isinstance(eval(line_list[header.index("length")]), list) else line_list[header.index("length")] # If this is a list due to multiedges, just load the first osmid
-
-            # Clean `maxspeed` to remove "mph" or other non-numeric characters
-            maxspeed_raw = line_list[header.index("maxspeed")].strip()
-            if not maxspeed_raw or not any(c.isdigit() for c in maxspeed_raw):  # Check for missing/invalid data
-                maxspeed = "0"  # Default maxspeed
-            else:
-                maxspeed = ''.join(filter(str.isdigit, maxspeed_raw)) 
-
-            line_string = "" + line_list[header.index("u")] + " "+ line_list[header.index("v")] + " " + osmid + " " + maxspeed + " " + highway + " " + length
-            lines.append(line_string)
-        G = nx.parse_edgelist(lines, nodetype = int, data = (("osmid", int),("maxspeed", int),("highway", str),("length", float)), create_using = nx.MultiDiGraph) # MultiDiGraph is necessary for OSMNX, for example for get_undirected(G) in utils_graph.py
-    with open(p + prefix + '_nodes.csv', 'r') as f:
-        header = f.readline().strip().split(",")
-        values_x = {}
-        values_y = {}
-        for line in csv.reader(f, quotechar='"', delimiter=',', quoting=csv.QUOTE_ALL, skipinitialspace=True):
-            line_list = [c for c in line]
-            osmid = int(line_list[header.index("osmid")])
-            values_x[osmid] = float(line_list[header.index("x")])
-            values_y[osmid] = float(line_list[header.index("y")])
-
-        nx.set_node_attributes(G, values_x, "x")
-        nx.set_node_attributes(G, values_y, "y")
+    mask = None
+    if not any([os.path.isfile(p + prefix + '_edges' + ext) for ext in ['.zip', '.csv']]):
+        mask = network_mask(p, placeid, parameterid)
+        if mask is not None:
+            prefix = placeid + '_union'
+    try:
+        n = read_zipped_csv(p, prefix + '_nodes', columns["nodes"])
+        e = read_zipped_csv(p, prefix + '_edges', columns["edges"])
+        if not set(["osmid", "x", "y"]).issubset(n.columns) or not set(["u", "v"]).issubset(e.columns):
+            n, e = None, None
+        elif mask is not None:
+            if len(mask) != len(e):
+                raise ValueError("The edge mask of " + placeid + "_" + parameterid + " does not match the union graph")
+            e = e[mask].reset_index(drop = True)
+            n = n[n["osmid"].isin(np.union1d(e["u"].to_numpy(), e["v"].to_numpy()))].reset_index(drop = True)
+            if not len(e):
+                n, e = None, None
+    except FileNotFoundError:
+        return None, None
+    except pd.errors.EmptyDataError:
+        n, e = None, None
+
+    if usegraphcache:
+        write_graph_cache(p, placeid, parameterid, n, e)
+    return n, e
+
+
+def vertex_index_map(G, rebuild = False):
+    """Return a dict from node id to vertex index of G.
+    The dict is cached on G and rebuilt when the number of vertices changed; vertex_index also rebuilds it on a miss or a stale entry.
+    Like vs.find, duplicate ids map to their first vertex.
+    """
+    cache = getattr(G, "_idtoindex", None)
+    if rebuild or cache is None or cache[0] != G.vcount():
+        ids = G.vs["id"] if "id" in G.vs.attributes() else []
+        cache = (G.vcount(), dict(zip(reversed(ids), range(len(ids)-1, -1, -1))))
+        G._idtoindex = cache
+    return cache[1]
 
-    if compress:
-        os.remove(p + prefix + '_nodes.csv')
-        os.remove(p + prefix + '_edges.csv')
-        
-    return G
 
+def vertex_index(G, id):
+    """Return the index of the vertex of G with node id id, the cached equivalent of G.vs.find(id = id).index
+    Raises ValueError if there is no such vertex.
+    """
+    index = vertex_index_map(G).get(id)
+    if index is None or G.vs[index]["id"] != id:
+        # Vertices or ids may have changed without changing the number of vertices since the map was built
+        index = vertex_index_map(G, True).get(id)
+    if index is None:
+        raise ValueError("no such vertex: " + str(id))
+    return index
+
+
+def edge_keys(G):
+    """Return the canonical (min id, max id) node id keys of the edges of G, in edge order, as a structured array.
+    Sorting these keys sorts lexicographically, so edge sets of graphs can be joined with np.searchsorted.
+    """
+    keytype = np.dtype([("lo", np.int64), ("hi", np.int64)])
+    if G.ecount() == 0 or "id" not in G.vs.attributes():
+        return np.zeros(0, dtype = keytype)
+    ids = np.array(G.vs["id"], dtype = np.int64)
+    edges = np.array(G.get_edgelist(), dtype = np.int64)
+    source, target = ids[edges[:, 0]], ids[edges[:, 1]]
+    keys = np.empty(len(edges), dtype = keytype)
+    keys["lo"] = np.minimum(source, target)
+    keys["hi"] = np.maximum(source, target)
+    return keys
+
+
+def keys_in(keys, otherkeys):
+    """Return a boolean mask of which keys are also in otherkeys, by a sorted-array join.
+    The id pairs are packed into single integers over their dense id ranks first, so the join sorts plain integers.
+    """
+    if len(keys) == 0 or len(otherkeys) == 0:
+        return np.zeros(len(keys), dtype = bool)
+    uniqueids, ranks = np.unique(np.concatenate([keys["lo"], keys["hi"], otherkeys["lo"], otherkeys["hi"]]), return_inverse = True)
+    n1, n2 = len(keys), len(otherkeys)
+    packed = ranks[:n1] * len(uniqueids) + ranks[n1:2*n1]
+    otherpacked = np.sort(ranks[2*n1:2*n1+n2] * len(uniqueids) + ranks[2*n1+n2:])
+    positions = np.minimum(np.searchsorted(otherpacked, packed), n2 - 1)
+    return otherpacked[positions] == packed
+
+
+class PoiList(list):
+    """List of POI node ids that also knows their vertex indices in the graph G it was loaded for
+    """
+    def __init__(self, ids, G = None, indices = None):
+        list.__init__(self, ids)
+        self.G = G
+        self.indices = indices
 
 
+def poi_vertex_indices(G, pois):
+    """Return the vertex indices in G of the POI node ids pois.
+    If pois was loaded for G from the POI store, this is a slice of the stored indices, otherwise they are looked up.
+    """
+    if isinstance(pois, PoiList) and pois.G is G:
+        return pois.indices.tolist()
+    return [vertex_index(G, poi) for poi in pois]
 
-def calculate_weight(row):
+
+def abstract_graph(G, indices):
+    """Return an edgeless graph of the vertices indices of G, with their attributes, ordered by index.
+    It equals G.subgraph(indices) after deleting all edges of G, but is built in O(len(indices))
+    without copying G. The edge attribute names of G are kept, so edges added later get the same ones.
     """
-    Calculate new weight based on length and speed limit.
+    indices = sorted(set(indices))
+    vs = G.vs[indices]
+    H = ig.Graph(n = len(indices), directed = G.is_directed(),
+                 graph_attrs = {a: G[a] for a in G.attributes()}, vertex_attrs = {a: vs[a] for a in G.vs.attributes()})
+    for a in G.es.attributes():
+        H.es[a] = []
+    return H
+
+
+def poi_store_file(p, placeid):
+    """Return the path of the POI store of placeid
+    """
+    return p + placeid + '_pois.npz'
+
+
+def poi_source_files(p, placeid):
+    """Return a dict of POI key: file for all POI node id files of placeid, like <placeid>_poi_grid_nnidscarall.csv (key grid_nnidscarall)
     """
-    # Default speed limit is 30 mph if 'maxspeed' is missing or NaN
-    if pd.isna(row['maxspeed']):
-        speed_factor = 3  # Corresponding to 30 mph
+    prefix = placeid + '_poi_'
+    return {f[len(prefix):-len('.csv')]: p + f for f in sorted(os.listdir(p)) if f.startswith(prefix) and f.endswith('.csv') and '_nnids' in f}
+
+
+def read_poi_store(p, placeid):
+    """Load the POI store of placeid as a dict of arrays: ids__<key> holds the POI node ids of every POI source, 
+    fingerprint__<parameterid> and indices__<key>__<parameterid> the vertex indices in the graph parameterid.
+    The store is rebuilt from the POI node id files if it is missing or older than any of them.
+    """
+    storefile = poi_store_file(p, placeid)
+    sources = poi_source_files(p, placeid)
+    if os.path.isfile(storefile) and os.path.getmtime(storefile) >= max([os.path.getmtime(f) for f in sources.values()], default = 0):
+        with np.load(storefile, allow_pickle = False) as f:
+            return {k: f[k] for k in f.files}
+    store = {}
+    for key, f in sources.items():
+        store["ids__" + key] = np.loadtxt(f, dtype = np.int64, ndmin = 1)
+    write_poi_store(p, placeid, store)
+    return store
+
+
+def write_poi_store(p, placeid, store):
+    """Write the POI store dict of arrays of placeid, via a temporary file
+    """
+    storefile = poi_store_file(p, placeid)
+    tmpfile = storefile + "." + str(os.getpid()) + ".tmp"
+    with open(tmpfile, 'wb') as f:
+        np.savez(f, **store)
+    os.replace(tmpfile, storefile)
+
+
+def load_pois(p, placeid, poi_source, G = None, parameterid = 'carall', nnidsgraph = 'carall'):
+    """Load the POI node ids of poi_source, snapped to the graph nnidsgraph, from the POI store of placeid.
+    If the graph G (loaded as parameterid) is given, the vertex indices of the POIs in G are returned with them.
+    They are stored for all POI sources at once, validated by the fingerprint of G, and recomputed only when G changed.
+    """
+    store = read_poi_store(p, placeid)
+    key = poi_source + '_nnids' + nnidsgraph
+    if "ids__" + key not in store:
+        raise FileNotFoundError(p + placeid + '_poi_' + key + '.csv')
+    ids = store["ids__" + key]
+    if G is None:
+        return PoiList(ids.tolist())
+
+    fingerprint = graph_fingerprint(G)
+    if store.get("fingerprint__" + parameterid) != fingerprint or "indices__" + key + "__" + parameterid not in store:
+        idtoindex = dict(zip(G.vs["id"], range(G.vcount())))
+        for k in [k[len("ids__"):] for k in store if k.startswith("ids__")]:
+            store["indices__" + k + "__" + parameterid] = np.array([idtoindex.get(i, -1) for i in store["ids__" + k].tolist()], dtype = np.int64)
+        store["fingerprint__" + parameterid] = np.array(fingerprint)
+        write_poi_store(p, placeid, store)
+    indices = store["indices__" + key + "__" + parameterid]
+    if (indices < 0).any():
+        raise ValueError("POI node ids of " + key + " are missing in the graph " + parameterid + " of " + placeid)
+    return PoiList(ids.tolist(), G, indices)
+
+
+def location_store_file(placeid):
+    """Return the path of the stored boundary polygon of placeid
+    """
+    return PATH["data"] + placeid + "/" + placeid + '_location.wkb'
+
+
+def write_location(placeid, location):
+    """Store the final (hole-filled) boundary polygon of placeid as WKB
+    """
+    os.makedirs(PATH["data"] + placeid, exist_ok = True)
+    tmpfile = location_store_file(placeid) + "." + str(os.getpid()) + ".tmp"
+    with open(tmpfile, 'wb') as f:
+        f.write(shapely.to_wkb(location))
+    os.replace(tmpfile, location_store_file(placeid))
+
+
+def load_location(placeid, placeinfo, refresh = False):
+    """Return the boundary polygon of placeid from the local store. 
+    Only if it is not stored yet (or refresh is set), it is geocoded via nominatim (or read from <placeid>.shp) and stored.
+    """
+    if not refresh and os.path.isfile(location_store_file(placeid)):
+        with open(location_store_file(placeid), 'rb') as f:
+            return shapely.from_wkb(f.read())
+    if placeinfo["nominatimstring"] != '':
+        location = ox.geocoder.geocode_to_gdf(placeinfo["nominatimstring"])
+        location = fill_holes(extract_relevant_polygon(placeid, shapely.geometry.shape(location['geometry'][0])))
     else:
-        speed_factor = int(str(row['maxspeed']).split()[0][0])  # Extract first digit from the speed. 
-        # This presumes no speed limit over 99, which is reasonable for most roads.
-        # however this could produce issues in some countries with speed limits over 100 km/h?
+        # https://gis.stackexchange.com/questions/113799/how-to-read-a-shapefile-in-python
+        shp = fiona.open(PATH["data"] + placeid + "/" + placeid + ".shp")
+        first = next(iter(shp))
+        location = shapely.geometry.shape(first['geometry'])
+    write_location(placeid, location)
+    return location
+
+
+def import_locations(filepath, placeidcolumn = "placeid"):
+    """Fill the location store from a file with one boundary polygon per city (e.g. a GeoPackage exported on a 
+    machine with network access), so machines without it never need the geocoder.
+    """
+    gdf = gpd.read_file(filepath).to_crs("EPSG:4326")
+    for placeid, location in zip(gdf[placeidcolumn], gdf.geometry):
+        write_location(placeid, location)
+
+
+def export_locations(cities, filepath):
+    """Write the stored boundary polygons of cities into one GeoPackage, to be read by import_locations
+    """
+    placeids = [placeid for placeid in cities if os.path.isfile(location_store_file(placeid))]
+    gdf = gpd.GeoDataFrame({"placeid": placeids}, geometry = [load_location(placeid, cities[placeid]) for placeid in placeids], crs = "EPSG:4326")
+    gdf.to_file(filepath, driver = "GPKG")
+
+
+def osm_extract_file(placeid):
+    """Return the path of the local OSM extract of placeid: <placeid>.osm.pbf or, if that does not exist, <placeid>.osm
+    """
+    filepath = PATH["data"] + placeid + "/" + placeid + ".osm.pbf"
+    return filepath if os.path.isfile(filepath) else PATH["data"] + placeid + "/" + placeid + ".osm"
+
+
+def osm_filter_clauses(osmfilter):
+    """Parse an overpass tag filter like '["highway"~"path"]["bicycle"~"designated"]' into a list of (key, operator, value, ignorecase).
+    operator is None (key exists), "=", "!=", "~" or "!~".
+    """
+    clauses = re.findall(r'\[\s*"([^"]+)"\s*(?:(!?~|!?=)\s*"([^"]*)"\s*(,\s*i)?)?\s*\]', osmfilter)
+    return [(key, operator if operator else None, value, bool(ignorecase)) for key, operator, value, ignorecase in clauses]
+
+
+def osm_tags_match(tags, clauses):
+    """Check if the tag dict of a way fulfils all clauses of a parsed overpass filter, with overpass semantics:
+    negated clauses also match if the key is missing, and regular expressions match anywhere in the value.
+    """
+    for key, operator, value, ignorecase in clauses:
+        if operator is None:
+            if key not in tags: return False
+        elif operator == "=":
+            if tags.get(key) != value: return False
+        elif operator == "!=":
+            if tags.get(key) == value: return False
+        else:
+            found = key in tags and re.search(value, tags[key], re.IGNORECASE if ignorecase else 0) is not None
+            if found != (operator == "~"): return False
+    return True
+
+
+def osm_network_filter(parameterinfo):
+    """Return the overpass filter of an osmnxparameters entry: the custom filter if given, otherwise the one of its network type in osmnetworkfilters
+    """
+    if parameterinfo['custom_filter']:
+        return parameterinfo['custom_filter']
+    if parameterinfo['network_type'] not in osmnetworkfilters:
+        raise ValueError("No overpass filter for network type " + parameterinfo['network_type'] + ". Add it to osmnetworkfilters in parameters.py.")
+    return osmnetworkfilters[parameterinfo['network_type']]
+
+
+def read_osm_extract(filepath, keys):
+    """Read the nodes and the ways having any of the tag keys from a local .osm or .osm.pbf file, in one pass.
+    Returns a dict of node id: (lon, lat) and a list of (way id, list of node ids, dict of tags).
+    .osm.pbf files need pyosmium.
+    """
+    nodes = {}
+    ways = []
+    if filepath.endswith(".pbf"):
+        import osmium
+        class ExtractHandler(osmium.SimpleHandler):
+            def node(self, n):
+                nodes[n.id] = (n.location.lon, n.location.lat)
+            def way(self, w):
+                tags = {t.k: t.v for t in w.tags}
+                if any([k in tags for k in keys]):
+                    ways.append((w.id, [n.ref for n in w.nodes], tags))
+        ExtractHandler().apply_file(filepath)
+    else:
+        for _, element in ET.iterparse(filepath):
+            if element.tag == "node":
+                nodes[int(element.get("id"))] = (float(element.get("lon")), float(element.get("lat")))
+                element.clear()
+            elif element.tag == "way":
+                tags = {t.get("k"): t.get("v") for t in element.iter("tag")}
+                if any([k in tags for k in keys]):
+                    ways.append((int(element.get("id")), [int(n.get("ref")) for n in element.iter("nd")], tags))
+                element.clear()
+            elif element.tag == "relation":
+                element.clear()
+    return nodes, ways
+
+
+def graphs_from_osm_extract(filepath, location, placeid, parameters = osmnxparameters):
+    """Build the unsimplified osmnx graphs of all parameters (like osmnxparameters) from a local OSM extract, in a single scan:
+    the file is read once and every way is checked against all tag filters. As with ox.graph_from_polygon, nodes outside 
+    the location polygon are truncated and, unless retain_all, only the largest weakly connected component is kept.
+    Returns a dict of parameterid: nx.MultiDiGraph.
+    """
+    clauses = {parameterid: osm_filter_clauses(osm_network_filter(parameterinfo)) for parameterid, parameterinfo in parameters.items()}
+    keys = set([c[0] for cl in clauses.values() for c in cl if c[1] in [None, "=", "~"]])
+    nodes, ways = read_osm_extract(filepath, keys)
+
+    # Truncate to the location polygon, for all nodes at once
+    nodeids = np.array(list(nodes.keys()), dtype = np.int64)
+    coords = np.array(list(nodes.values()), dtype = float).reshape(-1, 2)
+    inside = dict(zip(nodeids.tolist(), shapely.contains_xy(location, coords[:, 0], coords[:, 1]).tolist()))
+
+    edgelists = {parameterid: [] for parameterid in parameters}
+    for wayid, waynodes, tags in ways:
+        parameterids = [parameterid for parameterid in parameters if osm_tags_match(tags, clauses[parameterid])]
+        if not parameterids: continue
+        attributes = {k: v for k, v in tags.items() if k in ox.settings.useful_tags_way}
+        oneway = tags.get("oneway") in ["yes", "true", "1", "-1", "reverse", "T"] or tags.get("junction") == "roundabout"
+        if tags.get("oneway") in ["-1", "reverse", "T"]:
+            waynodes = waynodes[::-1]
+        for parameterid in parameterids:
+            bidirectional = parameters[parameterid]['network_type'] in ox.settings.bidirectional_network_types
+            for u, v in zip(waynodes[:-1], waynodes[1:]):
+                if not (inside.get(u, False) and inside.get(v, False)): continue
+                edgelists[parameterid].append((u, v, dict(attributes, osmid = wayid, oneway = oneway and not bidirectional, reversed = False)))
+                if not oneway or bidirectional:
+                    edgelists[parameterid].append((v, u, dict(attributes, osmid = wayid, oneway = oneway and not bidirectional, reversed = True)))
+
+    Gs = {}
+    for parameterid, parameterinfo in parameters.items():
+        G = nx.MultiDiGraph(crs = 'epsg:4326')
+        G.add_edges_from(edgelists[parameterid])
+        if not parameterinfo['retain_all'] and G.number_of_nodes():
+            G = G.subgraph(max(nx.weakly_connected_components(G), key = len)).copy()
+        nx.set_node_attributes(G, {n: nodes[n][0] for n in G.nodes}, "x")
+        nx.set_node_attributes(G, {n: nodes[n][1] for n in G.nodes}, "y")
+        if G.number_of_edges():
+            # Great-circle lengths of all edges at once, with the earth radius osmnx uses
+            uvk = list(G.edges(keys = True))
+            lon1, lat1 = np.radians(np.array([nodes[u] for u, _, _ in uvk])).T
+            lon2, lat2 = np.radians(np.array([nodes[v] for _, v, _ in uvk])).T
+            h = np.sin((lat2 - lat1) / 2)**2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2)**2
+            lengths = 2 * 6371009 * np.arcsin(np.sqrt(np.clip(h, 0, 1)))
+            nx.set_edge_attributes(G, dict(zip(uvk, lengths.tolist())), "length")
+        else:
+            print(placeid + ": No OSM data for graph " + parameterid + ". Created empty graph.")
+        Gs[parameterid] = G
+    return Gs
+
+
+def first_listitem(column):
+    """Take the first item of list-valued entries of a csv column, in bulk.
+    Multiedges have values like "[123, 456]" or "['20 mph', '30 mph']"; these become "123" or "20 mph".
+    Other entries are kept. Columns that pandas already parsed as numbers are returned unchanged.
+    """
+    if column.dtype.kind in "biuf":
+        return column
+    column = column.astype(str).str.strip()
+    islist = column.str.startswith("[")
+    firstitems = column.str[1:].str.split(",", n = 1).str[0].str.strip(" ]").str.strip("'\"")
+    return column.where(~islist, firstitems)
+
+
+def clean_maxspeed(column):
+    """Turn a raw maxspeed column into integers by keeping only its digits ("30 mph" becomes 30), in bulk.
+    Missing values or values without digits become 0. Of list values only the first speed is used.
+    """
+    digits = first_listitem(column.fillna("")).astype(str).str.replace(r"\D", "", regex = True)
+    return digits.where(digits != "", "0").astype(np.int64)
+
+
+class EdgeTable:
+    """Compact array-backed core of a street network, from which the igraph, networkx and GeoDataFrame views are built on demand.
+    Nodes are held as int64 ids and float64 coordinates, edges as int32 endpoint indices into the nodes,
+    int64 osmids (the first one of multiedges), float64 lengths and categorical highway/maxspeed codes.
+    Endpoint ids that are not in the node table are appended after the vcount real nodes, without coordinates.
+    """
+    def __init__(self, n, e):
+        ids = n["osmid"].to_numpy(dtype = np.int64)
+        self.vcount = len(ids)
+        positions = pd.Series(np.arange(len(ids)), index = ids)
+        positions = positions[~positions.index.duplicated(keep = "last")] # For duplicate ids, the last node wins, as in osm_to_ig
+        endpointids = np.concatenate([e["u"].to_numpy(dtype = np.int64), e["v"].to_numpy(dtype = np.int64)])
+        indices = positions.index.get_indexer(endpointids)
+        found = indices >= 0
+        indices[found] = positions.to_numpy()[indices[found]]
+        # Missing endpoint ids are appended in the order they first appear, first in u, then in v
+        extraids, first, inverse = np.unique(endpointids[~found], return_index = True, return_inverse = True)
+        rank = np.empty(len(extraids), dtype = np.int64)
+        rank[np.argsort(first, kind = "stable")] = np.arange(len(extraids))
+        indices[~found] = len(ids) + rank[inverse.reshape(-1)]
+        self.ids = np.concatenate([ids, extraids[np.argsort(first, kind = "stable")]])
+        self.x = n["x"].to_numpy(dtype = float)
+        self.y = n["y"].to_numpy(dtype = float)
+        self.u, self.v = indices.astype(np.int32).reshape(2, -1)
+        self.osmid = first_listitem(e["osmid"]).astype(np.int64).to_numpy()
+        self.length = first_listitem(e["length"]).astype(float).to_numpy()
+        self.highway = pd.Categorical(e["highway"]) if "highway" in e.columns else None
+        self.maxspeed = pd.Categorical(e["maxspeed"]) if "maxspeed" in e.columns else None
+
+    def __len__(self):
+        return len(self.u)
+
+    @property
+    def nbytes(self):
+        arrays = [self.ids, self.x, self.y, self.u, self.v, self.osmid, self.length]
+        arrays += [c.codes for c in (self.highway, self.maxspeed) if c is not None]
+        return sum([a.nbytes for a in arrays])
+
+    def check_endpoints(self):
+        if len(self.ids) > self.vcount:
+            raise ValueError("Edge endpoint " + str(self.ids[self.vcount]) + " is not in the node table")
+
+    def categorical_values(self, column, func, missing):
+        """Apply func to the categories of the categorical column only, and spread the results to all edges.
+        Missing values become missing.
+        """
+        values = np.asarray(func(pd.Series(column.categories)).tolist() + [missing], dtype = object)
+        return values[column.codes] # Code -1 picks the appended missing value
+
+    def maxspeeds(self, default = defaultmaxspeed):
+        """Speed limits as floats, from the first number of the first list item ("['20 mph', '30 mph']" becomes 20),
+        and default where missing or without digits (e.g. "GB:nsl_single")
+        """
+        def parse(c):
+            return first_listitem(c).astype(str).str.extract(r"(\d+)", expand = False).astype(float).fillna(float(default))
+        if self.maxspeed is None:
+            return np.full(len(self), float(default))
+        return self.categorical_values(self.maxspeed, parse, default).astype(float)
+
+    def lts(self):
+        """Level of traffic stress of the (first) highway tag of each edge, from tag_lts. Other or missing tags count as 1"""
+        def parse(c):
+            return first_listitem(c).astype(str).map(lambda h: tag_lts.get(h, 1))
+        if self.highway is None:
+            return np.ones(len(self))
+        return self.categorical_values(self.highway, parse, 1).astype(float)
+
+    def costs(self, weighting = None):
+        """The edge cost columns needed for weighting, each computed in one vectorized pass: always the raw length as weight,
+        and the length times the speed limit as cost_speed or the length times the LTS as cost_lts (see weighting_column).
+        """
+        costs = {"weight": self.length}
+        column = weighting_column(weighting)
+        if column == "cost_speed":
+            costs[column] = self.length * self.maxspeeds()
+        elif column == "cost_lts":
+            costs[column] = self.length * self.lts()
+        return costs
+
+    def to_ig(self, weighting = None):
+        """Build the igraph view, exactly as osm_to_ig, round_coordinates and mirror_y would from the tables.
+        The weight is the length, and the cost column of weighting is attached next to it, so routing only picks another column.
+        """
+        self.check_endpoints()
+        G = ig.Graph(n = self.vcount, edges = np.column_stack([self.u, self.v]).tolist(), directed = False,
+                     vertex_attrs = {"x": np.round(self.x, 7).tolist(), "y": (-np.round(self.y, 7)).tolist(), "id": self.ids.tolist()})
+        for name, cost in self.costs(weighting).items():
+            G.es[name] = np.round(cost, 10).tolist()
+        G.es["osmid"] = self.osmid.tolist()
+        G.simplify(combine_edges=max)
+        return G
+
+    def to_ox(self, highway = False, weighting = None):
+        """Build the networkx MultiDiGraph view with edge attributes osmid, length, the cost column of weighting if any and, 
+        if highway, also maxspeed (cleaned to integers) and highway. Only nodes with edges are added, they get attributes x and y.
+        """
+        G = nx.MultiDiGraph() # MultiDiGraph is necessary for OSMNX, for example for get_undirected(G) in utils_graph.py
+        attributes = {"osmid": self.osmid.tolist()}
+        if highway:
+            attributes["maxspeed"] = self.categorical_values(self.maxspeed, clean_maxspeed, 0).tolist() # Clean `maxspeed` to remove "mph" or other non-numeric characters
+            attributes["highway"] = self.categorical_values(self.highway, lambda c: first_listitem(c).astype(str), "").tolist()
+        attributes["length"] = self.length.tolist()
+        for name, cost in self.costs(weighting).items():
+            if name != "weight":
+                attributes[name] = cost.tolist()
+        names = list(attributes.keys())
+        G.add_edges_from(zip(self.ids[self.u].tolist(), self.ids[self.v].tolist(), [dict(zip(names, values)) for values in zip(*attributes.values())]))
+        ids = self.ids[:self.vcount].tolist()
+        nx.set_node_attributes(G, dict(zip(ids, self.x.tolist())), "x")
+        nx.set_node_attributes(G, dict(zip(ids, self.y.tolist())), "y")
+        return G
+
+    def to_gdfs(self, nodes = True, edges = True):
+        """Build GeoDataFrames of the nodes and edges, like ox.graph_to_gdfs does for the networkx view,
+        with straight edge geometries. The coordinate and code columns are not copied into Python objects.
+        """
+        self.check_endpoints()
+        gdfs = []
+        if nodes:
+            gdfs.append(gpd.GeoDataFrame({"y": self.y, "x": self.x}, index = pd.Index(self.ids, name = "osmid"),
+                                         geometry = gpd.points_from_xy(self.x, self.y), crs = "epsg:4326"))
+        if edges:
+            key = pd.DataFrame({"u": self.u, "v": self.v}).groupby(["u", "v"]).cumcount().to_numpy()
+            index = pd.MultiIndex.from_arrays([self.ids[self.u], self.ids[self.v], key], names = ["u", "v", "key"])
+            columns = {"osmid": self.osmid, "length": self.length}
+            for name, column in (("highway", self.highway), ("maxspeed", self.maxspeed)):
+                if column is not None: columns[name] = column
+            coords = np.stack([np.stack([self.x[self.u], self.y[self.u]], axis = 1), np.stack([self.x[self.v], self.y[self.v]], axis = 1)], axis = 1)
+            gdfs.append(gpd.GeoDataFrame(columns, index = index, geometry = shapely.linestrings(coords), crs = "epsg:4326"))
+        return gdfs[0] if len(gdfs) == 1 else tuple(gdfs)
+
+
+def load_edgetable(p, placeid, parameterid):
+    """Load the EdgeTable of placeid, parameterid, or None if the graph is empty or does not exist.
+    The views built from it do not keep it, so it is freed as soon as the caller drops it.
+    """
+    n, e = read_graph_tables(p, placeid, parameterid)
+    if n is None:
+        return None
+    return EdgeTable(n, e)
+
+
+def csv_to_ox(p, placeid, parameterid, weighting = None):
+    """ Load a networkx graph from _edges.csv and _nodes.csv
+    The edge file must have attributes u,v,osmid,length
+    The node file must have attributes y,x,osmid
+    Only these attributes are loaded, plus the cost column of weighting (see weighting_column).
+    """
+    if not graph_source_files(p, placeid, parameterid):
+        raise FileNotFoundError("No data files of network " + placeid + "_" + parameterid + " in " + p)
+    table = load_edgetable(p, placeid, parameterid)
+    if table is None: # The network exists but is empty
+        return nx.MultiDiGraph()
     
-    # Multiply the speed factor by the length to get the new weight
-    return row['length'] * speed_factor
+    # If osmid or length are lists due to multiedges, the table holds just the first one
+    return table.to_ox(weighting = weighting)
 
 
 
+def csv_to_ox_highway(p, placeid, parameterid, weighting = None): #  this is a modification of the orignal csv_to_ox function to include
+    """ Load a networkx graph from _edges.csv and _nodes.csv
+    The edge file must have attributes u,v,osmid,maxspeed,highway,length
+    The node file must have attributes y,x,osmid
+    Only these attributes are loaded, plus the cost column of weighting (see weighting_column).
+    """
+    if not graph_source_files(p, placeid, parameterid):
+        raise FileNotFoundError("No data files of network " + placeid + "_" + parameterid + " in " + p)
+    table = load_edgetable(p, placeid, parameterid)
+    if table is None: # The network exists but is empty
+        return nx.MultiDiGraph()
+
+    # If osmid, highway or length are lists due to multiedges, just load the first one
+    return table.to_ox(highway = True, weighting = weighting)
 
 
 
@@ -498,34 +1249,15 @@ def csv_to_ig(p, placeid, parameterid, cleanup=True, weighting=None):
     The edge file must have attributes u,v,osmid,length
     The node file must have attributes y,x,osmid
     Only these attributes are loaded.
+    The csv files are streamed out of their zip files, so cleanup has nothing left to do and is only kept for compatibility.
+    The weight is always the length. With weighting, its cost column (cost_speed or cost_lts, see weighting_column)
+    is attached next to it, and routing with the same weighting picks it (see cost_column).
     """
-    prefix = placeid + '_' + parameterid
-    compress = check_extract_zip(p, prefix)
-    empty = False
-    try:
-        n = pd.read_csv(p + prefix + '_nodes.csv')
-        e = pd.read_csv(p + prefix + '_edges.csv')
-    except:
-        empty = True
-
-    if compress and cleanup and not SERVER:  # Do not clean up on the server as csv is needed in parallel jobs
-        os.remove(p + prefix + '_nodes.csv')
-        os.remove(p + prefix + '_edges.csv')
-
-    if empty:
+    table = load_edgetable(p, placeid, parameterid)
+    if table is None:
         return ig.Graph(directed=False)
 
-    if weighting:
-        # Process the edges to modify length based on speed limits
-        e['maxspeed'] = e['maxspeed'].str.replace(' mph', '', regex=False).astype(float)
-        e['maxspeed'].fillna(20, inplace=True)  # Assign default speed of 20 where NaN
-        e['ori_length'] = e['length']  # Store original length only if weighting is True
-        e['length'] = e['length'] * e['maxspeed']  # Modify the length based on speed
-
-    G = osm_to_ig(n, e, weighting)  # Pass weighting to osm_to_ig
-    round_coordinates(G)
-    mirror_y(G)
-    return G
+    return table.to_ig(weighting)
 
 
 
@@ -537,6 +1269,69 @@ def ig_to_geojson(G):
     return G_geojson
 
 
+def ig_to_gdf(G, edgeattributes = []):
+    """Turn an igraph graph G into a GeoDataFrame with one LineString per edge, built in one vectorized
+    pass from the vertex coordinate arrays. As in ig_to_geojson, the mirrored y coordinates are turned back.
+    """
+    x = np.array(G.vs["x"] if G.vcount() else [], dtype = float)
+    y = -np.array(G.vs["y"] if G.vcount() else [], dtype = float)
+    edges = np.array(G.get_edgelist(), dtype = np.int64).reshape(-1, 2)
+    coords = np.stack([np.stack([x[edges[:, 0]], y[edges[:, 0]]], axis = 1), np.stack([x[edges[:, 1]], y[edges[:, 1]]], axis = 1)], axis = 1)
+    columns = {a: G.es[a] for a in edgeattributes if a in G.es.attribute_names()}
+    return gpd.GeoDataFrame(columns, geometry = shapely.linestrings(coords), crs = "EPSG:4326")
+
+
+gpkg_geometrytypes = {"Point": ogr.wkbPoint, "LineString": ogr.wkbLineString, "Polygon": ogr.wkbPolygon,
+                      "MultiPoint": ogr.wkbMultiPoint, "MultiLineString": ogr.wkbMultiLineString, "MultiPolygon": ogr.wkbMultiPolygon}
+
+def write_gpkg(layers, filepath):
+    """Write a dict of layername: GeoDataFrame as layers of one GeoPackage. Empty layers are skipped.
+    All layers are written through one GDAL dataset in a single transaction, instead of reopening the file for every layer.
+    Integer and float columns keep their type, all other columns are written as text. Missing values stay empty.
+    The file is written to a temporary name first and then moved, so it is never left half written.
+    """
+    layers = {layername: gdf for layername, gdf in layers.items() if len(gdf)}
+    if not layers:
+        return
+    tmpfile = filepath + "." + str(os.getpid()) + ".tmp.gpkg"
+    if os.path.isfile(tmpfile): os.remove(tmpfile)
+    ds = ogr.GetDriverByName("GPKG").CreateDataSource(tmpfile)
+    ds.StartTransaction()
+    for layername, gdf in layers.items():
+        srs = None
+        if gdf.crs is not None:
+            srs = osr.SpatialReference()
+            srs.ImportFromWkt(gdf.crs.to_wkt())
+        geomtypes = set(gdf.geom_type.dropna())
+        layer = ds.CreateLayer(layername, srs, gpkg_geometrytypes.get(geomtypes.pop(), ogr.wkbUnknown) if len(geomtypes) == 1 else ogr.wkbUnknown)
+        columns = [c for c in gdf.columns if c != gdf.geometry.name]
+        converters = []
+        for c in columns:
+            kind = gdf[c].dtype.kind
+            if kind in "biu":
+                layer.CreateField(ogr.FieldDefn(str(c), ogr.OFTInteger64))
+                converters.append(int)
+            elif kind == "f":
+                layer.CreateField(ogr.FieldDefn(str(c), ogr.OFTReal))
+                converters.append(float)
+            else:
+                layer.CreateField(ogr.FieldDefn(str(c), ogr.OFTString))
+                converters.append(str)
+        defn = layer.GetLayerDefn()
+        values = [gdf[c].tolist() for c in columns]
+        for row, wkb in zip(zip(*values) if columns else [()] * len(gdf), shapely.to_wkb(gdf.geometry.values)):
+            feature = ogr.Feature(defn)
+            for j, value in enumerate(row):
+                if value is not None and not (isinstance(value, float) and math.isnan(value)):
+                    feature.SetField(j, converters[j](value))
+            if wkb is not None:
+                feature.SetGeometry(ogr.CreateGeometryFromWkb(wkb))
+            layer.CreateFeature(feature)
+    ds.CommitTransaction()
+    ds = None # Closes the dataset
+    os.replace(tmpfile, filepath)
+
+
 
 
 # NETWORK GENERATION
@@ -580,41 +1375,48 @@ def new_edge_intersects(G, enew):
     return False
     
 
-def delete_overlaps(G_res, G_orig, verbose = False):
+def overlap_mask(G_res, G_orig):
+    """Boolean mask over the edges of G_res of those that are also in G_orig, based on node ids
+    """
+    mask = np.zeros(G_res.ecount(), dtype = bool)
+    if "id" in G_res.vs.attributes():
+        mask = keys_in(edge_keys(G_res), edge_keys(G_orig))
+    return mask
+
+
+def delete_overlaps(G_res, G_orig, verbose = False, mask = False):
     """Deletes inplace all overlaps of G_res with G_orig (from G_res)
     based on node ids. In other words: G_res -= G_orig
+    Returns the indices of the deleted edges. If mask, G_res is left untouched and only the boolean
+    overlap mask over its edges is returned, so callers can select the rest without copying G_res first.
     """
-    del_edges = []
-    for e in list(G_res.es):
-        try:
-            n1_id = e.source_vertex["id"]
-            n2_id = e.target_vertex["id"]
-            # If there is already an edge in the original network, delete it
-            n1_index = G_orig.vs.find(id = n1_id).index
-            n2_index = G_orig.vs.find(id = n2_id).index
-            if G_orig.are_connected(n1_index, n2_index):
-                del_edges.append(e.index)
-        except:
-            pass
-    G_res.delete_edges(del_edges)
+    overlaps = overlap_mask(G_res, G_orig)
+    if mask:
+        return overlaps
+    del_edges = np.flatnonzero(overlaps)
+    G_res.delete_edges(del_edges.tolist())
     # Remove isolated nodes
     isolated_nodes = G_res.vs.select(_degree_eq=0)
     G_res.delete_vertices(isolated_nodes)
     if verbose: print("Removed " + str(len(del_edges)) + " overlapping edges and " + str(len(isolated_nodes)) + " nodes.")
+    return del_edges
 
-def constrict_overlaps(G_res, G_orig, factor = 5):
-    """Increases length by factor of all overlaps of G_res with G_orig (in G_res) based on edge ids.
+def constrict_overlaps(G_res, G_orig, factor = 5, mask = False, weighting = None):
+    """Increases the routing cost by factor of all overlaps of G_res with G_orig (in G_res) based on edge ids.
+    The cost is the cost column of weighting (see cost_column), the length (weight) without weighting.
+    Returns the indices of the constricted edges. If mask, G_res is left untouched and only the boolean
+    overlap mask over its edges is returned.
     """
-    for e in list(G_res.es):
-        try:
-            n1_id = e.source_vertex["id"]
-            n2_id = e.target_vertex["id"]
-            n1_index = G_orig.vs.find(id = n1_id).index
-            n2_index = G_orig.vs.find(id = n2_id).index
-            if G_orig.are_connected(n1_index, n2_index):
-                G_res.es[e.index]["weight"] = factor * G_res.es[e.index]["weight"]
-        except:
-            pass
+    overlaps = overlap_mask(G_res, G_orig)
+    if mask:
+        return overlaps
+    constricted = np.flatnonzero(overlaps)
+    if len(constricted):
+        column = cost_column(G_res, weighting)
+        costs = np.array(G_res.es[column], dtype = float)
+        costs[constricted] *= factor
+        G_res.es[column] = costs.tolist()
+    return constricted
 
 
 
@@ -637,9 +1439,6 @@ def greedy_triangulation_routing_clusters(G, G_total, clusters, clusterinfo, pru
     if len(clusters) < 2: return ([], []) # We can't do anything with less than 2 clusters
 
     centroid_indices = [v["centroid_index"] for k, v in sorted(clusterinfo.items(), key=lambda item: item[1]["size"], reverse = True)]
-    G_temp = copy.deepcopy(G_total)
-    for e in G_temp.es: # delete all edges
-        G_temp.es.delete(e)
     
     clusterpairs = clusterpairs_by_distance(G, G_total, clusters, clusterinfo, True, verbose, full_run)
     if len(clusterpairs) == 0: return ([], [])
@@ -649,7 +1448,7 @@ def greedy_triangulation_routing_clusters(G, G_total, clusters, clusterinfo, pru
     GT_abstracts = []
     GTs = []
     for prune_quantile in prune_quantiles:
-        GT_abstract = copy.deepcopy(G_temp.subgraph(centroid_indices))
+        GT_abstract = abstract_graph(G_total, centroid_indices)
         GT_abstract = greedy_triangulation(GT_abstract, centroidpairs, prune_quantile, prune_measure)
         GT_abstracts.append(GT_abstract)
 
@@ -669,11 +1468,11 @@ def greedy_triangulation_routing_clusters(G, G_total, clusters, clusterinfo, pru
         # Do the routing, on G_total
         GT_indices = set()
         for poipair, poipair_distance in routenodepairs:
-            poipair_ind = (G_total.vs.find(id = poipair[0]).index, G_total.vs.find(id = poipair[1]).index)
+            poipair_ind = (vertex_index(G_total, poipair[0]), vertex_index(G_total, poipair[1]))
             sp = set(G_total.get_shortest_paths(poipair_ind[0], poipair_ind[1], weights = "weight", output = "vpath")[0])
             GT_indices = GT_indices.union(sp)
 
-        GT = G_total.induced_subgraph(GT_indices)
+        GT = SubgraphView(G_total, list(GT_indices))
         GTs.append(GT)
     
     return(GTs, GT_abstracts)
@@ -695,15 +1494,16 @@ def clusterpairs_by_distance(G, G_total, clusters, clusterinfo, return_distances
     # Create copies of all clusters
     for i in range(len(cluster_indices)):
         clustercopies[i] = clusters[i].copy()
+    idtoindex = vertex_index_map(G_total)
         
     # Take one cluster
     for i, c1 in enumerate(cluster_indices[:-1]):
-        c1_indices = G_total.vs.select(lambda x: x["id"] in clustercopies[c1].vs()["id"]).indices
+        c1_indices = sorted(set(idtoindex[id] for id in clustercopies[c1].vs["id"] if id in idtoindex))
         print("Working on cluster " + str(i+1) + " of " + str(len(cluster_indices)) + "...")
         for j, c2 in enumerate(cluster_indices[i+1:]):
             closest_pair = {'i': -1, 'j': -1}
             min_dist = np.inf
-            c2_indices = G_total.vs.select(lambda x: x["id"] in clustercopies[c2].vs()["id"]).indices
+            c2_indices = sorted(set(idtoindex[id] for id in clustercopies[c2].vs["id"] if id in idtoindex))
             if verbose: print("... routing " + str(len(c1_indices)) + " nodes to " + str(len(c2_indices)) + " nodes in other cluster " + str(j+1) + " of " + str(len(cluster_indices[i+1:])) + ".")
             
             if full_run:
@@ -738,7 +1538,7 @@ def clusterpairs_by_distance(G, G_total, clusters, clusterinfo, return_distances
                                 closest_pair['j'] = G_total.vs[c2_index]["id"]
                                 min_dist = dist_nodes
                 # Closest c2 node to centroid1 found. Now find all c1 nodes to that closest c2 node.
-                b = G_total.vs.find(id = closest_pair['j']).index
+                b = vertex_index(G_total, closest_pair['j'])
                 sp = G_total.get_shortest_paths(b, c1_indices, weights = "weight", output = "epath")
                 if all([not elem for elem in sp]):
                     # If there is no path from one node, there is no path from any node
@@ -776,19 +1576,14 @@ def mst_routing(G, pois, weighting=None):
     if len(pois) < 2: return (ig.Graph(), ig.Graph()) # We can't do anything with less than 2 POIs
 
     # MST_abstract is the MST with same nodes but euclidian links
-    pois_indices = set()
-    for poi in pois:
-        pois_indices.add(G.vs.find(id = poi).index)
-    G_temp = copy.deepcopy(G)
-    for e in G_temp.es: # delete all edges
-        G_temp.es.delete(e)
+    pois_indices = set(poi_vertex_indices(G, pois))
         
     poipairs = poipairs_by_distance(G, pois, weighting, True)
     if len(poipairs) == 0: return (ig.Graph(), ig.Graph())
 
-    MST_abstract = copy.deepcopy(G_temp.subgraph(pois_indices))
+    MST_abstract = abstract_graph(G, pois_indices)
     for poipair, poipair_distance in poipairs:
-        poipair_ind = (MST_abstract.vs.find(id = poipair[0]).index, MST_abstract.vs.find(id = poipair[1]).index)
+        poipair_ind = (vertex_index(MST_abstract, poipair[0]), vertex_index(MST_abstract, poipair[1]))
         MST_abstract.add_edge(poipair_ind[0], poipair_ind[1] , weight = poipair_distance)
     MST_abstract = MST_abstract.spanning_tree(weights = "weight")
 
@@ -801,11 +1596,11 @@ def mst_routing(G, pois, weighting=None):
     # Do the routing
     MST_indices = set()
     for poipair, poipair_distance in routenodepairs:
-        poipair_ind = (G.vs.find(id = poipair[0]).index, G.vs.find(id = poipair[1]).index)
-        sp = set(G.get_shortest_paths(poipair_ind[0], poipair_ind[1], weights = "weight", output = "vpath")[0])
+        poipair_ind = (vertex_index(G, poipair[0]), vertex_index(G, poipair[1]))
+        sp = set(G.get_shortest_paths(poipair_ind[0], poipair_ind[1], weights = cost_column(G, weighting), output = "vpath")[0])
         MST_indices = MST_indices.union(sp)
 
-    MST = G.induced_subgraph(MST_indices)
+    MST = SubgraphView(G, list(MST_indices))
     
     return (MST, MST_abstract)
 
@@ -822,7 +1617,7 @@ def greedy_triangulation(GT, poipairs, prune_quantile = 1, prune_measure = "betw
     """
     
     for poipair, poipair_distance in poipairs:
-        poipair_ind = (GT.vs.find(id = poipair[0]).index, GT.vs.find(id = poipair[1]).index)
+        poipair_ind = (vertex_index(GT, poipair[0]), vertex_index(GT, poipair[1]))
         if not new_edge_intersects(GT, (GT.vs[poipair_ind[0]]["x"], GT.vs[poipair_ind[0]]["y"], GT.vs[poipair_ind[1]]["x"], GT.vs[poipair_ind[1]]["y"])):
             GT.add_edge(poipair_ind[0], poipair_ind[1], weight = poipair_distance)
             
@@ -854,10 +1649,21 @@ def greedy_triangulation(GT, poipairs, prune_quantile = 1, prune_measure = "betw
     return GT
 
 
-def restore_original_lengths(G):
-    """Restore original lengths from the 'ori_length' attribute."""
-    for e in G.es:
-        e["weight"] = e["ori_length"]
+def weighting_column(weighting = None):
+    """Name of the edge cost column of weighting: the length (weight) without weighting,
+    the LTS-weighted cost cost_lts for weighting "lts", and the speed-weighted cost cost_speed for any other weighting.
+    """
+    if not weighting:
+        return "weight"
+    return "cost_lts" if weighting == "lts" else "cost_speed"
+
+
+def cost_column(G, weighting = None):
+    """Name of the edge attribute of G to route on for weighting (see weighting_column).
+    Falls back to weight if G has no such cost column, e.g. if it was loaded without weighting.
+    """
+    column = weighting_column(weighting)
+    return column if column in G.es.attributes() else "weight"
  
 
 
@@ -879,21 +1685,16 @@ def greedy_triangulation_routing(G, pois, weighting=None, prune_quantiles = [1],
     if len(pois) < 2: return ([], []) # We can't do anything with less than 2 POIs
 
     # GT_abstract is the GT with same nodes but euclidian links to keep track of edge crossings
-    pois_indices = set()
-    for poi in pois:
-        pois_indices.add(G.vs.find(id = poi).index)
-    G_temp = copy.deepcopy(G)
-    for e in G_temp.es: # delete all edges
-        G_temp.es.delete(e)
+    pois_indices = set(poi_vertex_indices(G, pois))
         
     poipairs = poipairs_by_distance(G, pois, weighting, True)
     if len(poipairs) == 0: return ([], [])
 
     if prune_measure == "random":
         # run the whole GT first
-        GT = copy.deepcopy(G_temp.subgraph(pois_indices))
+        GT = abstract_graph(G, pois_indices)
         for poipair, poipair_distance in poipairs:
-            poipair_ind = (GT.vs.find(id = poipair[0]).index, GT.vs.find(id = poipair[1]).index)
+            poipair_ind = (vertex_index(GT, poipair[0]), vertex_index(GT, poipair[1]))
             if not new_edge_intersects(GT, (GT.vs[poipair_ind[0]]["x"], GT.vs[poipair_ind[0]]["y"], GT.vs[poipair_ind[1]]["x"], GT.vs[poipair_ind[1]]["y"])):
                 GT.add_edge(poipair_ind[0], poipair_ind[1], weight = poipair_distance)
         # create a random order for the edges
@@ -905,7 +1706,7 @@ def greedy_triangulation_routing(G, pois, weighting=None, prune_quantiles = [1],
     GT_abstracts = []
     GTs = []
     for prune_quantile in tqdm(prune_quantiles, desc = "Greedy triangulation", leave = False):
-        GT_abstract = copy.deepcopy(G_temp.subgraph(pois_indices))
+        GT_abstract = abstract_graph(G, pois_indices)
         GT_abstract = greedy_triangulation(GT_abstract, poipairs, prune_quantile, prune_measure, edgeorder)
         GT_abstracts.append(GT_abstract)
         
@@ -918,16 +1719,16 @@ def greedy_triangulation_routing(G, pois, weighting=None, prune_quantiles = [1],
         # Do the routing
         GT_indices = set()
         for poipair, poipair_distance in routenodepairs:
-            poipair_ind = (G.vs.find(id = poipair[0]).index, G.vs.find(id = poipair[1]).index)
+            poipair_ind = (vertex_index(G, poipair[0]), vertex_index(G, poipair[1]))
             # debug
             #print(f"Edge weights before routing: {G.es['weight'][:10]}")  # Prints first 10 weights
             #print(f"Routing between: {poipair[0]} and {poipair[1]} with distance: {poipair_distance}")
-            sp = set(G.get_shortest_paths(poipair_ind[0], poipair_ind[1], weights = "weight", output = "vpath")[0])
+            sp = set(G.get_shortest_paths(poipair_ind[0], poipair_ind[1], weights = cost_column(G, weighting), output = "vpath")[0])
             #print(f"Shortest path between {poipair[0]} and {poipair[1]}: {sp}")
 
             GT_indices = GT_indices.union(sp)
 
-        GT = G.induced_subgraph(GT_indices)
+        GT = SubgraphView(G, list(GT_indices))
         GTs.append(GT)
     
     return (GTs, GT_abstracts)
@@ -937,32 +1738,28 @@ def poipairs_by_distance(G, pois, weighting=None, return_distances = False):
     """Calculates the (weighted) graph distances on G for a subset of nodes pois.
     Returns all pairs of poi ids in ascending order of their distance. 
     If return_distances, then distances are also returned.
-    If we are using a weighted graph, we need to calculate the distances using orignal
-    edge lengths rather than adjusted weighted lengths.
+    Paths are routed on the cost column picked by weighting (see cost_column), but their distances
+    are always summed from the original edge lengths.
     """
     
     # Get poi indices
-    indices = []
-    for poi in pois:
-        indices.append(G_carall.vs.find(id = poi).index)
+    indices = poi_vertex_indices(G_carall, pois)
     
     # Get sequences of nodes and edges in shortest paths between all pairs of pois
     poi_nodes = []
     poi_edges = []
+    costs = cost_column(G, weighting)
     for c, v in enumerate(indices):
-        poi_nodes.append(G.get_shortest_paths(v, indices[c:], weights = "weight", output = "vpath"))
-        poi_edges.append(G.get_shortest_paths(v, indices[c:], weights = "weight", output = "epath"))
+        poi_nodes.append(G.get_shortest_paths(v, indices[c:], weights = costs, output = "vpath"))
+        poi_edges.append(G.get_shortest_paths(v, indices[c:], weights = costs, output = "epath"))
 
-    # Sum up weights (distances) of all paths
+    # Sum up lengths (distances) of all paths
+    lengths = G.es["weight"]
     poi_dist = {}
     for paths_n, paths_e in zip(poi_nodes, poi_edges):
         for path_n, path_e in zip(paths_n, paths_e):
             # Sum up distances of path segments from first to last node
-            if weighting:
-                # Use the 'weight' for finding the shortest path
-                path_dist = sum([G.es[e]['ori_length'] for e in path_e])  # Use 'ori_length' for distance
-            else:
-                path_dist = sum([G.es[e]['weight'] for e in path_e])  # Fallback to 'weight' if weighting is False
+            path_dist = sum([lengths[e] for e in path_e])
             
             if path_dist > 0:
                 poi_dist[(path_n[0], path_n[-1])] = path_dist
@@ -1076,8 +1873,7 @@ def calculate_coverage_edges(G, buffer_m = 500, return_cov = False, G_prev = ig.
     If G_prev and cov_prev are given, only the difference between G and G_prev are calculated, then added to cov_prev.
     """
 
-    G_added = copy.deepcopy(G)
-    delete_overlaps(G_added, G_prev)
+    added = ~delete_overlaps(G, G_prev, mask = True) # Only the edges not in G_prev, without copying G
 
     # https://gis.stackexchange.com/questions/121256/creating-a-circle-with-radius-in-metres
     loncenter = listmean([v["x"] for v in G.vs])
@@ -1090,7 +1886,7 @@ def calculate_coverage_edges(G, buffer_m = 500, return_cov = False, G_prev = ig.
     aeqd_to_wgs84 = pyproj.Transformer.from_proj(
         pyproj.Proj(local_azimuthal_projection),
         pyproj.Proj("+proj=longlat +datum=WGS84 +no_defs"))
-    edgetuples = [((e.source_vertex["x"], e.source_vertex["y"]), (e.target_vertex["x"], e.target_vertex["y"])) for e in G_added.es]
+    edgetuples = [((e.source_vertex["x"], e.source_vertex["y"]), (e.target_vertex["x"], e.target_vertex["y"])) for e in G.es[np.flatnonzero(added).tolist()]]
     # Shapely buffer seems slow for complex objects: https://stackoverflow.com/questions/57753813/speed-up-shapely-buffer
     # Therefore we buffer piecewise.
     cov_added = Polygon()
@@ -1119,9 +1915,7 @@ def calculate_poiscovered(G, cov, nnids):
     """Calculates how many nodes, given by nnids, are covered by the shapely (multi)polygon cov
     """
     
-    pois_indices = set()
-    for poi in nnids:
-        pois_indices.add(G.vs.find(id = poi).index)
+    pois_indices = set(poi_vertex_indices(G, nnids))
 
     poiscovered = 0
     for poi in pois_indices:
@@ -1208,12 +2002,14 @@ def calculate_metrics(
 
     output = {key: 0 for key in calcmetrics}
     cov = Polygon()
+    G, GT_abstract = as_igraph(G), as_igraph(GT_abstract) # Views are built, networkx graphs (e.g. from 03e) converted
 
     # Check that the graph has links (sometimes we have an isolated node)
     if G.ecount() > 0 and GT_abstract.ecount() > 0:
-        # Get LCC
+        G_prev = as_igraph(G_prev)
+        # Get LCC, as a view that is only built if a metric needs it
         cl = G.clusters()
-        LCC = cl.giant()
+        LCC = SubgraphView(G, np.flatnonzero(np.array(cl.membership) == np.argmax(cl.sizes())))
 
         # EFFICIENCY
         if not ignore_GT_abstract:
@@ -1242,14 +2038,14 @@ def calculate_metrics(
             output["length"] = sum([e['weight'] for e in G.es])
         if "length_lcc" in calcmetrics:
             if len(cl) > 1:
-                output["length_lcc"] = sum([e['weight'] for e in LCC.es])
+                output["length_lcc"] = sum(LCC.edge_attribute('weight'))
             else:
                 output["length_lcc"] = output["length"]
         
         # COVERAGE
         if "coverage" in calcmetrics:
             if verbose: print("Calculating coverage...")
-            covered_area, cov = calculate_coverage_edges(G, buffer_walk, return_cov, G_prev, cov_prev)
+            covered_area, cov = calculate_coverage_edges(G, buffer_walk, True, G_prev, cov_prev) # The cover is needed for poi_coverage even if it is not returned
             output["coverage"] = covered_area
 
             # OVERLAP WITH EXISTING NETS
@@ -1284,6 +2080,8 @@ def calculate_metrics(
             output["components"] = len(list(G.components()))
         
         # DIRECTNESS
+        if len(cl) > 1 and ("directness_lcc" in calcmetrics or "directness_lcc_linkwise" in calcmetrics):
+            LCC = LCC.graph()
         if verbose and ("directness" in calcmetrics or "directness_lcc" in calcmetrics): print("Calculating directness...")
         if "directness" in calcmetrics:
             output["directness"] = calculate_directness(G, numnodepairs)
@@ -1328,52 +2126,34 @@ def edge_lengths(G):
 
 def intersect_igraphs(G1, G2):
     """Generates the graph intersection of igraph graphs G1 and G2, copying also link and node attributes.
+    Edges are matched by their canonical node id keys in one sorted-array join. Edge attributes are taken 
+    from the graph with fewer edges, node attributes from the other one, which also gives the vertex order.
     """
     # Ginter = G1.__and__(G2) # This does not work with attributes.
-    if G1.ecount() > G2.ecount(): # Iterate through edges of the smaller graph
+    if G1.ecount() > G2.ecount(): # Take the edges of the smaller graph
         G1, G2 = G2, G1
-    inter_nodes = set()
-    inter_edges = []
-    inter_edge_attributes = {}
-    inter_node_attributes = {}
     edge_attribute_name_list = G2.edge_attributes()
     node_attribute_name_list = G2.vertex_attributes()
-    for edge_attribute_name in edge_attribute_name_list:
-        inter_edge_attributes[edge_attribute_name] = []
-    for node_attribute_name in node_attribute_name_list:
-        inter_node_attributes[node_attribute_name] = []
-    for e in list(G1.es):
-        n1_id = e.source_vertex["id"]
-        n2_id = e.target_vertex["id"]
-        try:
-            n1_index = G2.vs.find(id = n1_id).index
-            n2_index = G2.vs.find(id = n2_id).index
-        except ValueError:
-            continue
-        if G2.are_connected(n1_index, n2_index):
-            inter_edges.append((n1_index, n2_index))
-            inter_nodes.add(n1_index)
-            inter_nodes.add(n2_index)
-            edge_attributes = e.attributes()
-            for edge_attribute_name in edge_attribute_name_list:
-                inter_edge_attributes[edge_attribute_name].append(edge_attributes[edge_attribute_name])
+    inter_edges = np.flatnonzero(keys_in(edge_keys(G1), edge_keys(G2)))
 
-    # map nodeids to first len(inter_nodes) integers
-    idmap = {n_index:i for n_index,i in zip(inter_nodes, range(len(inter_nodes)))}
+    # Endpoints of the intersecting edges as vertex indices of G2, keeping the orientation of G1
+    ids1 = np.array(G1.vs["id"] if G1.vcount() else [], dtype = np.int64)
+    ids2 = np.array(G2.vs["id"] if G2.vcount() else [], dtype = np.int64)
+    edges = np.array(G1.get_edgelist(), dtype = np.int64).reshape(-1, 2)[inter_edges]
+    order = np.argsort(ids2, kind = "stable") # For duplicate ids, the first vertex is used, like vs.find
+    endpoints = order[np.searchsorted(ids2[order], ids1[edges])].reshape(-1, 2) if len(edges) else edges
 
+    # map nodeids to first len(inter_nodes) integers
+    inter_nodes = np.unique(endpoints)
     G_inter = ig.Graph()
     G_inter.add_vertices(len(inter_nodes))
-    G_inter.add_edges([(idmap[e[0]], idmap[e[1]]) for e in inter_edges])
+    G_inter.add_edges(np.searchsorted(inter_nodes, endpoints).tolist())
     for edge_attribute_name in edge_attribute_name_list:
-        G_inter.es[edge_attribute_name] = inter_edge_attributes[edge_attribute_name]
-
-    for n_index in idmap.keys():
-        v = G2.vs[n_index]
-        node_attributes = v.attributes()
-        for node_attribute_name in node_attribute_name_list:
-            inter_node_attributes[node_attribute_name].append(node_attributes[node_attribute_name])
+        values = G1.es[edge_attribute_name] if edge_attribute_name in G1.es.attributes() else [None] * G1.ecount()
+        G_inter.es[edge_attribute_name] = [values[i] for i in inter_edges.tolist()]
     for node_attribute_name in node_attribute_name_list:
-        G_inter.vs[node_attribute_name] = inter_node_attributes[node_attribute_name]
+        values = G2.vs[node_attribute_name]
+        G_inter.vs[node_attribute_name] = [values[i] for i in inter_nodes.tolist()]
 
     return G_inter
 
@@ -1400,6 +2180,7 @@ def calculate_metrics_additively(
 
     for GT, GT_abstract, prune_quantile in zip(Gs, GT_abstracts, tqdm(prune_quantiles, desc="Bicycle networks", leave=False)):
         if verbose: print("Calculating bike network metrics for quantile " + str(prune_quantile))
+        GT = as_igraph(GT) # Built once, and kept as GT_prev for the next quantile
         metrics, cov = calculate_metrics(
             GT, GT_abstract, G_big, nnids, output, buffer_walk, numnodepairs, verbose, 
             return_cov, GT_prev, cov_prev, False, Gexisting, Gneighbourhoods
@@ -1408,12 +2189,74 @@ def calculate_metrics_additively(
         for key in output.keys():
             output[key].append(metrics[key])
         covs[prune_quantile] = cov
-        cov_prev = copy.deepcopy(cov)
-        GT_prev = copy.deepcopy(GT)
+        cov_prev = cov # Neither is modified by calculate_metrics, so no copies are needed
+        GT_prev = GT
 
     return output, covs
 
 
+backfill_state = {} # Inputs of the result being backfilled, handed to the worker processes by forking
+
+def backfill_metrics_of(i):
+    """Calculate the backfill metrics of the i-th grown network, or of the MST if i is -1. Runs in a worker process.
+    """
+    res = backfill_state["res"]
+    if i == -1:
+        G, GT_abstract = res["MST"], res["MST_abstract"]
+    else:
+        G, GT_abstract = res["GTs"][i], res["GT_abstracts"][i]
+    return calculate_metrics(G, GT_abstract, backfill_state["G_big"], backfill_state["nnids"], {metric: 0 for metric in backfill_state["metrics"]}, 
+                             backfill_state["buffer_walk"], backfill_state["numnodepairs"], False, False, Gexisting = backfill_state["Gexisting"])
+
+
+def merge_result_columns(output, filepath):
+    """Replace or add the columns of output (dict of column: values, or column: value for all rows) in the result csv filepath.
+    All other columns are kept as they are, under the result lock so no other job writes in between.
+    """
+    with result_lock(filepath):
+        df = pd.read_csv(filepath)
+        for column, values in output.items():
+            df[column] = values
+        write_result_file(df.to_dict("list"), "dict", filepath)
+
+
+def backfill_metrics(placeid, poi_source, prune_measure, metrics, weighting = None, buffer_walk = 500, numnodepairs = 500, workers = backfillworkers):
+    """Calculate only the given metrics for an existing result and merge them into its csv files and the results table.
+    Only the inputs these metrics need are loaded. Metrics that do not depend on the cover are calculated for all
+    quantiles and the MST in parallel; coverage, poi_coverage and the overlaps build on the cover of the previous
+    quantile, so they are calculated additively in order.
+    """
+    G_carall = csv_to_ig(PATH["data"] + placeid + "/", placeid, 'carall')
+    res = load_result_growth(placeid, poi_source, prune_measure, G_carall, weighting)
+    needcover = [m for m in metrics if m in ["coverage", "poi_coverage", "overlap_biketrack", "overlap_bikeable"]]
+    nnids = load_pois(PATH["data"] + placeid + "/", placeid, poi_source, G_carall) if "poi_coverage" in metrics else []
+    Gexisting = {}
+    if "overlap_biketrack" in metrics or "overlap_bikeable" in metrics:
+        for networktype in ["biketrack", "bikeable"]:
+            Gexisting[networktype] = csv_to_ig(PATH["data"] + placeid + "/", placeid, networktype)
+
+    backfill_state.update({"res": res, "G_big": G_carall, "nnids": nnids, "Gexisting": Gexisting, "metrics": metrics, "buffer_walk": buffer_walk, "numnodepairs": numnodepairs})
+    if needcover:
+        calcmetrics = list(metrics) + (["coverage"] if "coverage" not in metrics else [])
+        output, _ = calculate_metrics_additively(res["GTs"], res["GT_abstracts"], res["prune_quantiles"], G_carall, nnids, buffer_walk, numnodepairs, False, True, Gexisting, 
+                                                 output = {metric: [] for metric in calcmetrics})
+        output = {metric: output[metric] for metric in metrics}
+        output_MST = calculate_metrics(res["MST"], res["MST_abstract"], G_carall, nnids, {metric: 0 for metric in calcmetrics}, buffer_walk, numnodepairs, False, False, Gexisting = Gexisting)
+        output_MST = {metric: output_MST[metric] for metric in metrics}
+    else:
+        with concurrent.futures.ProcessPoolExecutor(workers, mp_context = multiprocessing.get_context("fork")) as executor:
+            outputs = list(executor.map(backfill_metrics_of, list(range(len(res["prune_quantiles"]))) + [-1]))
+        output = {metric: [o[metric] for o in outputs[:-1]] for metric in metrics}
+        output_MST = outputs[-1]
+    backfill_state.clear()
+
+    merge_result_columns(output, PATH["results"] + placeid + "/" + result_filename(placeid, poi_source, prune_measure, ".csv", weighting))
+    merge_result_columns(output_MST, PATH["results"] + placeid + "/" + result_filename(placeid, poi_source, "", "mst.csv", weighting))
+    ingest_results(output, placeid, poi_source, prune_measure, "bikegrown", res["prune_quantiles"], weighting)
+    ingest_results(output_MST, placeid, poi_source, "", "mst", weighting = weighting)
+    return output, output_MST
+
+
 def generate_video(placeid, imgname, vformat = "webm", duplicatelastframe = 5, verbose = True):
     """Generate a video from a set of images using OpenCV
     """
@@ -1446,18 +2289,12 @@ def generate_video(placeid, imgname, vformat = "webm", duplicatelastframe = 5, v
 
 
 
-def write_result(res, mode, placeid, poi_source, prune_measure, suffix, dictnested={}, weighting=None):
-    """Write results (pickle or dict to csv)
+def result_filename(placeid, poi_source, prune_measure, suffix, weighting=None):
+    """Construct the filename of a result, based on whether poi_source and prune_measure are provided or not
     """
-    if mode == "pickle":
-        openmode = "wb"
-    else:
-        openmode = "w"
-
     # Modify filename based on weighting flag
     weighting_str = "_weighted" if weighting else ""
     
-    # Construct the filename based on whether prune_measure is provided or not
     if poi_source:
         if prune_measure:
             filename = placeid + '_poi_' + poi_source + "_" + prune_measure + weighting_str + suffix
@@ -1468,25 +2305,67 @@ def write_result(res, mode, placeid, poi_source, prune_measure, suffix, dictnest
             filename = placeid + "_" + prune_measure + weighting_str + suffix
         else:
             filename = placeid + weighting_str + suffix
+    return filename
+
+
+result_locks_held = set() # (filepath, thread) of the result locks held by this process, so they can be nested
+
+@contextlib.contextmanager
+def result_lock(filepath):
+    """Hold an exclusive lock for the result file filepath, so jobs writing the same result
+    (same city, parameter set and weighting) one after the other never interleave.
+    """
+    key = (os.path.abspath(filepath), threading.get_ident())
+    if key in result_locks_held:
+        yield
+        return
+    with open(filepath + ".lock", "a") as lockfile:
+        fcntl.flock(lockfile, fcntl.LOCK_EX)
+        result_locks_held.add(key)
+        try:
+            yield
+        finally:
+            result_locks_held.discard(key)
+            fcntl.flock(lockfile, fcntl.LOCK_UN)
+
+
+def write_result_file(res, mode, filepath, dictnested={}):
+    """Write results (pickle or dict to csv) to filepath atomically: the file is written under a temporary name
+    and moved into place while holding the result lock, so readers and parallel jobs only ever see complete files.
+    """
+    if mode == "pickle":
+        openmode = "wb"
+    else:
+        openmode = "w"
+
+    tmpfile = filepath + "." + str(os.getpid()) + "." + str(threading.get_ident()) + ".tmp"
+    with result_lock(filepath):
+        with open(tmpfile, openmode) as f:
+            if mode == "pickle":
+                pickle.dump(res, f)
+            elif mode == "dict":
+                w = csv.writer(f)
+                w.writerow(res.keys())
+                try:  # dict with list values
+                    w.writerows(zip(*res.values()))
+                except:  # dict with single values
+                    w.writerow(res.values())
+            elif mode == "dictnested":
+                fields = ['network'] + list(dictnested.keys())
+                w = csv.DictWriter(f, fields)
+                w.writeheader()
+                for key, val in sorted(res.items()):
+                    row = {'network': key}
+                    row.update(val)
+                    w.writerow(row)
+        os.replace(tmpfile, filepath)
 
-    with open(PATH["results"] + placeid + "/" + filename, openmode) as f:
-        if mode == "pickle":
-            pickle.dump(res, f)
-        elif mode == "dict":
-            w = csv.writer(f)
-            w.writerow(res.keys())
-            try:  # dict with list values
-                w.writerows(zip(*res.values()))
-            except:  # dict with single values
-                w.writerow(res.values())
-        elif mode == "dictnested":
-            fields = ['network'] + list(dictnested.keys())
-            w = csv.DictWriter(f, fields)
-            w.writeheader()
-            for key, val in sorted(res.items()):
-                row = {'network': key}
-                row.update(val)
-                w.writerow(row)
+
+def write_result(res, mode, placeid, poi_source, prune_measure, suffix, dictnested={}, weighting=None):
+    """Write results (pickle or dict to csv)
+    """
+    filename = result_filename(placeid, poi_source, prune_measure, suffix, weighting)
+    write_result_file(res, mode, PATH["results"] + placeid + "/" + filename, dictnested)
 
                 
 
@@ -1495,10 +2374,8 @@ def write_result_covers(res, mode, placeid, suffix, dictnested={}, weighting=Non
     """Write results (pickle or dict to csv), with _weighted before the file extension if needed
     """
     if mode == "pickle":
-        openmode = "wb"
         file_extension = ".pickle"
     else:
-        openmode = "w"
         file_extension = ".csv"
 
     # Modify filename to append '_weighted' before the file extension if weighting is True
@@ -1511,26 +2388,496 @@ def write_result_covers(res, mode, placeid, suffix, dictnested={}, weighting=Non
     filename = placeid + "_" + suffix
 
     # Write the file
-    with open(PATH["results"] + placeid + "/" + filename, openmode) as f:
-        if mode == "pickle":
-            pickle.dump(res, f)
-        elif mode == "dict":
-            w = csv.writer(f)
-            w.writerow(res.keys())
-            try:  # dict with list values
-                w.writerows(zip(*res.values()))
-            except:  # dict with single values
-                w.writerow(res.values())
-        elif mode == "dictnested":
-            # Writing nested dictionary to CSV
-            fields = ['network'] + list(dictnested.keys())
-            w = csv.DictWriter(f, fields)
-            w.writeheader()
-            for key, val in sorted(res.items()):
-                row = {'network': key}
-                row.update(val)
-                w.writerow(row)
+    write_result_file(res, mode, PATH["results"] + placeid + "/" + filename, dictnested)
+
+
+
+
+def graph_fingerprint(G):
+    """Fingerprint of the structure of an igraph graph G: its vertex ids and its edge list.
+    Edge weights are not included, so weighted and unweighted loads of the same network share the fingerprint.
+    """
+    h = hashlib.sha1()
+    h.update(np.array(G.vs["id"] if G.vcount() else [], dtype = np.int64).tobytes())
+    h.update(np.array(G.get_edgelist(), dtype = np.int64).tobytes())
+    return h.hexdigest()
+
+
+def igraphs_to_arrays(Gs, name):
+    """Flatten a list of (small) igraph graphs into concatenated numpy arrays with offsets.
+    Attribute columns keep their type (int, float, bool or str, other values are stored as str). Entries that
+    are None, also of attributes missing in some of the graphs, are stored as a boolean mask next to the column.
+    """
+    arrays = {name + "_vcounts": np.array([G.vcount() for G in Gs], dtype = np.int64),
+              name + "_ecounts": np.array([G.ecount() for G in Gs], dtype = np.int64),
+              name + "_edges": np.array([e for G in Gs for e in G.get_edgelist()], dtype = np.int64).reshape(-1, 2)}
+    for kind, seqs in (("v", [G.vs for G in Gs]), ("e", [G.es for G in Gs])):
+        attributenames = set([a for seq in seqs for a in seq.attribute_names()])
+        for attributename in attributenames:
+            values = []
+            for seq in seqs:
+                values += seq[attributename] if attributename in seq.attribute_names() else [None] * len(seq)
+            missing = np.array([v is None for v in values], dtype = bool)
+            present = pd.Series([v for v in values if v is not None], dtype = object).infer_objects()
+            present = present.to_numpy() if present.dtype.kind in "biuf" else np.array(present.astype(str).tolist(), dtype = str)
+            column = np.zeros(len(values), dtype = present.dtype if len(present) else float)
+            column[~missing] = present
+            arrays[name + "_" + kind + "_" + attributename] = column
+            if missing.any():
+                arrays[name + "_" + kind + "none_" + attributename] = missing
+    return arrays
+
+
+def arrays_to_igraphs(arrays, name):
+    """Rebuild the list of igraph graphs flattened by igraphs_to_arrays, with None restored where it was.
+    """
+    vcounts, ecounts = arrays[name + "_vcounts"], arrays[name + "_ecounts"]
+    voffsets = np.concatenate([[0], np.cumsum(vcounts)])
+    eoffsets = np.concatenate([[0], np.cumsum(ecounts)])
+    attributes = {}
+    for kind in ["v", "e"]:
+        attributes[kind] = {k[len(name) + 3:]: (arrays[k], arrays.get(name + "_" + kind + "none_" + k[len(name) + 3:]))
+                            for k in arrays if k.startswith(name + "_" + kind + "_")}
+    Gs = []
+    for i in range(len(vcounts)):
+        G = ig.Graph(n = int(vcounts[i]), edges = arrays[name + "_edges"][eoffsets[i]:eoffsets[i+1]].tolist())
+        for kind, seq, offsets in (("v", G.vs, voffsets), ("e", G.es, eoffsets)):
+            for attributename, (values, missing) in attributes[kind].items():
+                column = values[offsets[i]:offsets[i+1]].tolist()
+                if missing is not None:
+                    for j in np.flatnonzero(missing[offsets[i]:offsets[i+1]]):
+                        column[j] = None
+                seq[attributename] = column
+        Gs.append(G)
+    return Gs
+
+
+class SubgraphView:
+    """Induced subgraph of a base graph G, kept only as the sorted indices of its vertices into G.
+    Vertex and edge attributes are read from G when asked for, and a real igraph graph is only built
+    by graph(), once, on first use. Other igraph calls (vs, es, clusters, ...) go to that graph, so
+    attribute changes through them stay in the view's graph and never reach G. Setting attributes
+    on the view itself raises, and pickling or copying a view keeps G and the indices, not the built graph.
+    """
+    _fields = ("G", "vertices", "edges", "built")
+
+    def __init__(self, G, vertices):
+        object.__setattr__(self, "G", G)
+        object.__setattr__(self, "vertices", np.unique(np.asarray(vertices, dtype = np.int64))) # Sorted, the vertex order of G.induced_subgraph
+        object.__setattr__(self, "edges", None)
+        object.__setattr__(self, "built", None)
+
+    def vcount(self):
+        return len(self.vertices)
+
+    def ecount(self):
+        return len(self.edge_indices())
 
+    def vertex_indices(self):
+        """Indices into G of the vertices"""
+        return self.vertices
+
+    def edge_indices(self):
+        """Indices into G of the edges, sorted. G.induced_subgraph may order its edges differently"""
+        if self.edges is None:
+            object.__setattr__(self, "edges", np.sort(np.array(self.G.es.select(_within = self.vertices.tolist()).indices if len(self.vertices) else [], dtype = np.int64)))
+        return self.edges
+
+    def vertex_attribute(self, name):
+        return self.G.vs[self.vertices.tolist()][name]
+
+    def edge_attribute(self, name):
+        return self.G.es[self.edge_indices().tolist()][name]
+
+    def graph(self):
+        """The real igraph graph, equal to G.induced_subgraph of the vertices. It is built on the first call and then kept"""
+        if self.built is None:
+            object.__setattr__(self, "built", self.G.induced_subgraph(self.vertices.tolist()))
+        return self.built
+
+    def __getattr__(self, name):
+        if name.startswith("_"): # Keep copy and pickle from building the graph
+            raise AttributeError(name)
+        return getattr(self.graph(), name)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("SubgraphView is read-only, set " + name + " on graph() instead")
+
+    def __getstate__(self):
+        return {"G": self.G, "vertices": self.vertices, "edges": self.edges}
+
+    def __setstate__(self, state):
+        for name in self._fields:
+            object.__setattr__(self, name, state.get(name))
+
+
+def as_igraph(G):
+    """Return G as a real igraph graph, building it if G is a SubgraphView and converting it with nx_to_ig if G is a networkx graph"""
+    if isinstance(G, SubgraphView):
+        return G.graph()
+    if isinstance(G, nx.Graph):
+        return nx_to_ig(G)
+    return G
+
+
+class GrowthSequence:
+    """The grown networks of one result, as a sequence over the prune quantiles.
+    Every grown network is an induced subgraph of the base graph G. It is only 
+    rebuilt from G when it is accessed, so unused quantiles cost nothing.
+    """
+    def __init__(self, G, firstquantile = None, membership = None):
+        self.G = G
+        self.firstquantile = firstquantile # per vertex of G: index of the first quantile containing it, -1 if none
+        self.membership = membership # fallback if the sequence is not nested: packed bits, one row per quantile
+        self.length = len(membership) if membership is not None else int(firstquantile.max(initial = -1)) + 1
+
+    def __len__(self):
+        return self.length
+
+    def vertex_indices(self, i):
+        """Indices into G of the vertices of the i-th grown network"""
+        if self.membership is not None:
+            return np.flatnonzero(np.unpackbits(self.membership[i], count = self.G.vcount()))
+        return np.flatnonzero((self.firstquantile >= 0) & (self.firstquantile <= i))
+
+    def edge_indices(self, i):
+        """Indices into G of the edges of the i-th grown network, without building it"""
+        return self.view(i).edge_indices()
+
+    def view(self, i):
+        """The i-th grown network as a SubgraphView of G"""
+        return SubgraphView(self.G, self.vertex_indices(i))
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0: i += len(self)
+        if not 0 <= i < len(self): raise IndexError("GrowthSequence index out of range")
+        return self.view(i).graph()
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+
+def write_result_growth(res, placeid, poi_source, prune_measure, G, weighting=None):
+    """Write a generation result compactly instead of pickling all its igraph graphs.
+    The grown networks res["GTs"] and res["MST"] (graphs or SubgraphViews) are stored as vertex sets of the base graph G:
+    for each vertex, the first prune quantile at which it appears. The POI-only abstract graphs are
+    small and are stored as flat arrays. Together with the fingerprint of G this is enough to
+    rebuild every graph with load_result_growth.
+    """
+    idtoindex = dict(zip(G.vs["id"], range(G.vcount())))
+    def indices_in_G(H):
+        if isinstance(H, SubgraphView) and H.G is G:
+            return H.vertex_indices()
+        return np.sort(np.array([idtoindex[i] for i in H.vs["id"]] if H.vcount() else [], dtype = np.int64))
+
+    arrays = {"version": np.array(1), "fingerprint": np.array(graph_fingerprint(G)),
+              "placeid": np.array(placeid), "poi_source": np.array(poi_source), "prune_measure": np.array(prune_measure),
+              "prune_quantiles": np.array(res["prune_quantiles"], dtype = float),
+              "mst_vertices": indices_in_G(res["MST"])}
+    
+    firstquantile = np.full(G.vcount(), -1, dtype = np.int16)
+    GT_indices = [indices_in_G(GT) for GT in res["GTs"]]
+    for i, indices in reversed(list(enumerate(GT_indices))):
+        firstquantile[indices] = i
+    nested = all([np.array_equal(indices, np.flatnonzero((firstquantile >= 0) & (firstquantile <= i))) for i, indices in enumerate(GT_indices)])
+    if nested:
+        arrays["gt_firstquantile"] = firstquantile
+    else: # Should not happen as routes only get added, but stay exact
+        membership = np.zeros((len(GT_indices), G.vcount()), dtype = bool)
+        for i, indices in enumerate(GT_indices):
+            membership[i, indices] = True
+        arrays["gt_membership"] = np.packbits(membership, axis = 1)
+    arrays.update(igraphs_to_arrays(list(res["GT_abstracts"]) + [res["MST_abstract"]], "abstract"))
+
+    filename = result_filename(placeid, poi_source, prune_measure, "_growth.npz", weighting)
+    tmpfile = PATH["results"] + placeid + "/" + filename + "." + str(os.getpid()) + "." + str(threading.get_ident()) + ".tmp"
+    with result_lock(PATH["results"] + placeid + "/" + filename):
+        with open(tmpfile, "wb") as f:
+            np.savez_compressed(f, **arrays)
+        os.replace(tmpfile, PATH["results"] + placeid + "/" + filename)
+
+
+def load_result_growth(placeid, poi_source, prune_measure, G, weighting=None):
+    """Load a generation result as a dict like the one written by 03 (placeid, prune_measure, poi_source,
+    prune_quantiles, GTs, GT_abstracts, MST, MST_abstract). GTs is a GrowthSequence rebuilding each grown
+    network lazily from the base graph G, which must be the graph the result was generated on, and MST is a SubgraphView of G.
+    Edge attributes (e.g. weight) are taken from G as passed.
+    Falls back to the old .pickle result if no compact result exists.
+    """
+    filename = result_filename(placeid, poi_source, prune_measure, "_growth.npz", weighting)
+    if not os.path.isfile(PATH["results"] + placeid + "/" + filename):
+        with open(PATH["results"] + placeid + "/" + result_filename(placeid, poi_source, prune_measure, ".pickle", weighting), 'rb') as f:
+            return pickle.load(f)
+
+    with np.load(PATH["results"] + placeid + "/" + filename, allow_pickle = False) as f:
+        arrays = {k: f[k] for k in f.files}
+    if str(arrays["fingerprint"]) != graph_fingerprint(G):
+        raise ValueError(filename + " was generated on a different graph than the one given.")
+    if "gt_membership" in arrays:
+        GTs = GrowthSequence(G, membership = arrays["gt_membership"])
+    else:
+        GTs = GrowthSequence(G, firstquantile = arrays["gt_firstquantile"])
+    abstracts = arrays_to_igraphs(arrays, "abstract")
+    res = {"placeid": str(arrays["placeid"]), "prune_measure": str(arrays["prune_measure"]), "poi_source": str(arrays["poi_source"]),
+           "prune_quantiles": arrays["prune_quantiles"].tolist(),
+           "GTs": GTs, "GT_abstracts": abstracts[:-1], 
+           "MST": SubgraphView(G, arrays["mst_vertices"]), "MST_abstract": abstracts[-1]}
+    return res
+
+
+
+def write_covers(covs, placeid, filename, precision = coverprecision):
+    """Write covers (a dict of shapely geometries, e.g. prune_quantile: cover or networktype: cover, or a single geometry) as WKB.
+    The file starts with the length of a small json index (8 bytes), followed by the index with the key, offset and length
+    of each cover, followed by the WKB of all covers. If precision is given, coordinates are snapped to a grid of that size (in degrees).
+    """
+    single = not isinstance(covs, dict)
+    if single: covs = {None: covs}
+    geoms = list(covs.values())
+    if precision:
+        geoms = shapely.set_precision(geoms, precision)
+    blobs = shapely.to_wkb(geoms)
+    lengths = [len(b) for b in blobs]
+    index = {"version": 1, "single": single, "keys": list(covs.keys()), 
+             "offsets": np.concatenate([[0], np.cumsum(lengths)[:-1]]).astype(int).tolist() if lengths else [], "lengths": lengths}
+    header = json.dumps(index).encode()
+    tmpfile = PATH["results"] + placeid + "/" + filename + "." + str(os.getpid()) + "." + str(threading.get_ident()) + ".tmp"
+    with result_lock(PATH["results"] + placeid + "/" + filename):
+        with open(tmpfile, 'wb') as f:
+            f.write(len(header).to_bytes(8, "little"))
+            f.write(header)
+            for b in blobs:
+                f.write(b)
+        os.replace(tmpfile, PATH["results"] + placeid + "/" + filename)
+
+
+class CoverStore:
+    """Read-only dict-like view of a cover file written by write_covers.
+    The file is memory-mapped and a cover is only decoded when it is accessed.
+    """
+    def __init__(self, filepath):
+        self.file = open(filepath, 'rb')
+        self.mm = mmap.mmap(self.file.fileno(), 0, access = mmap.ACCESS_READ)
+        headerlength = int.from_bytes(self.mm[:8], "little")
+        self.index = json.loads(self.mm[8:8+headerlength].decode())
+        self.start = 8 + headerlength
+        self.positions = {k: (o, l) for k, o, l in zip(self.index["keys"], self.index["offsets"], self.index["lengths"])}
+
+    def __getitem__(self, key):
+        offset, length = self.positions[key]
+        return shapely.from_wkb(self.mm[self.start+offset:self.start+offset+length])
+
+    def __len__(self):
+        return len(self.positions)
+
+    def __iter__(self):
+        return iter(self.index["keys"])
+
+    def __contains__(self, key):
+        return key in self.positions
+
+    def keys(self):
+        return list(self.index["keys"])
+
+    def values(self):
+        return (self[k] for k in self.index["keys"])
+
+    def items(self):
+        return ((k, self[k]) for k in self.index["keys"])
+
+    def close(self):
+        self.mm.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class CoverDict(dict):
+    """Covers loaded from an old .pickle file, with the close and with-block interface of CoverStore"""
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+def load_covers(placeid, filename):
+    """Load covers written by write_covers: a CoverStore, or the geometry itself if a single geometry was written.
+    Falls back to the old .pickle covers, as a CoverDict, if no .wkb file exists.
+    A CoverStore keeps its file open until it is closed, so use it in a with block.
+    """
+    if not os.path.isfile(PATH["results"] + placeid + "/" + filename):
+        with open(PATH["results"] + placeid + "/" + filename.replace(".wkb", ".pickle"), 'rb') as f:
+            covs = pickle.load(f)
+        return CoverDict(covs) if isinstance(covs, dict) else covs
+    covs = CoverStore(PATH["results"] + placeid + "/" + filename)
+    if covs.index["single"]:
+        cov = covs[None]
+        covs.close()
+        return cov
+    return covs
+
+
+
+file_digests = {} # (filepath, size, mtime): digest, so unchanged files are only hashed once per run
+
+def file_digest(filepath):
+    """Return the sha1 digest of the content of filepath, or "missing" if it does not exist
+    """
+    if not os.path.isfile(filepath):
+        return "missing"
+    stat = os.stat(filepath)
+    memokey = (os.path.abspath(filepath), stat.st_size, stat.st_mtime_ns)
+    if memokey not in file_digests:
+        h = hashlib.sha1()
+        with open(filepath, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                h.update(block)
+        file_digests[memokey] = h.hexdigest()
+    return file_digests[memokey]
+
+
+def stage_key(inputfiles, parameters, scripts = []):
+    """Hash everything a pipeline stage depends on: the content of its input files, the values of the
+    parameters it uses (dict of name: value), and the code version, i.e. functions.py and the stage scripts.
+    """
+    h = hashlib.sha1()
+    for filepath in sorted(inputfiles):
+        h.update((os.path.basename(filepath) + ":" + file_digest(filepath) + "\n").encode())
+    for name in sorted(parameters.keys()):
+        h.update((name + "=" + repr(parameters[name]) + "\n").encode())
+    for script in ["../code/functions.py"] + scripts:
+        h.update((os.path.basename(script) + ":" + file_digest(script) + "\n").encode())
+    return h.hexdigest()
+
+
+def stage_file(p, placeid, stage):
+    """Return the path of the file holding the input key of the last completed run of a stage
+    """
+    return p + placeid + '_' + stage + '.stagekey'
+
+
+def stage_is_current(p, placeid, stage, key, outputs = []):
+    """Check if the stage was last completed with the same input key and all its output files still exist
+    """
+    if not usestagecache or not os.path.isfile(stage_file(p, placeid, stage)):
+        return False
+    with open(stage_file(p, placeid, stage)) as f:
+        if f.read().strip() != key:
+            return False
+    return all([os.path.isfile(f) for f in outputs])
+
+
+def stage_done(p, placeid, stage, key):
+    """Record that the stage was completed with the input key. Call this only after all outputs are written.
+    """
+    tmpfile = stage_file(p, placeid, stage) + "." + str(os.getpid()) + ".tmp"
+    with open(tmpfile, 'w') as f:
+        f.write(key + "\n")
+    os.replace(tmpfile, stage_file(p, placeid, stage))
+
+
+
+def results_db():
+    """Connect to the cross-city results table in the results folder, creating it if needed.
+    It holds one row per metric value, keyed by placeid, poi_source, prune_measure, weighted, network and quantile.
+    network is "bikegrown" or "mst" for generated networks and the network type for existing infrastructure (with empty 
+    poi_source and prune_measure). quantile is -1 for results that are not per prune quantile.
+    """
+    con = sqlite3.connect(PATH["results"] + "results.sqlite", timeout = 600)
+    con.execute("CREATE TABLE IF NOT EXISTS results (placeid TEXT, poi_source TEXT, prune_measure TEXT, weighted INTEGER, network TEXT, quantile REAL, metric TEXT, value REAL, "
+                "PRIMARY KEY (placeid, poi_source, prune_measure, weighted, network, quantile, metric))")
+    con.execute("CREATE INDEX IF NOT EXISTS results_query ON results (metric, poi_source, prune_measure, weighted, network)")
+    return con
+
+
+def ingest_results(output, placeid, poi_source, prune_measure, network, prune_quantiles = None, weighting = None):
+    """Add the metrics of one result to the results table, replacing earlier values of the same keys.
+    output is a dict of metric: list of values per prune quantile (if prune_quantiles is given) or metric: value.
+    """
+    rows = []
+    for metric, values in output.items():
+        if prune_quantiles is not None:
+            rows += [(placeid, poi_source, prune_measure, int(bool(weighting)), network, float(q), metric, float(v)) for q, v in zip(prune_quantiles, values)]
+        else:
+            rows.append((placeid, poi_source, prune_measure, int(bool(weighting)), network, -1., metric, float(values)))
+    con = results_db()
+    with con:
+        con.executemany("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+    con.close()
+
+
+def ingest_result_csvs(placeid, poi_source_list, prune_measure_list, weighting = None):
+    """Add the results of placeid that were written as csv files before the results table existed.
+    Generated results are matched to prune_quantiles by row; files with another number of rows are skipped.
+    """
+    weighting_str = "_weighted" if weighting else ""
+    for filename in [placeid + "_existing" + weighting_str + ".csv", result_filename(placeid, "", "", "existing.csv", weighting)]:
+        if os.path.isfile(PATH["results"] + placeid + "/" + filename):
+            df = pd.read_csv(PATH["results"] + placeid + "/" + filename)
+            for _, row in df.iterrows():
+                ingest_results(row.drop("network").to_dict(), placeid, "", "", row["network"], weighting = weighting)
+            break
+    for poi_source in poi_source_list:
+        for prune_measure in prune_measure_list:
+            filename = result_filename(placeid, poi_source, prune_measure, ".csv", weighting)
+            if os.path.isfile(PATH["results"] + placeid + "/" + filename):
+                df = pd.read_csv(PATH["results"] + placeid + "/" + filename)
+                if len(df) == len(prune_quantiles):
+                    ingest_results(df.to_dict("list"), placeid, poi_source, prune_measure, "bikegrown", prune_quantiles, weighting)
+                else:
+                    print(placeid + ": " + filename + " does not have one row per prune quantile, skipping")
+        filename = result_filename(placeid, poi_source, "", "mst.csv", weighting)
+        if os.path.isfile(PATH["results"] + placeid + "/" + filename):
+            df = pd.read_csv(PATH["results"] + placeid + "/" + filename)
+            if len(df):
+                ingest_results(df.iloc[-1].to_dict(), placeid, poi_source, "", "mst", weighting = weighting)
+
+
+def query_results(wide = True, **filters):
+    """Query the results table. filters are column = value or column = list of values, 
+    e.g. query_results(poi_source = "grid", metric = ["length", "coverage"], weighted = 0).
+    If wide, metrics become columns, otherwise one row per metric value is returned.
+    """
+    conditions, parameters = [], []
+    for column, value in filters.items():
+        values = value if isinstance(value, (list, tuple, set)) else [value]
+        conditions.append(column + " IN (" + ", ".join(["?"] * len(values)) + ")")
+        parameters += list(values)
+    con = results_db()
+    df = pd.read_sql_query("SELECT * FROM results" + (" WHERE " + " AND ".join(conditions) if conditions else ""), con, params = parameters)
+    con.close()
+    if wide:
+        df = df.pivot_table(index = ["placeid", "poi_source", "prune_measure", "weighted", "network", "quantile"], columns = "metric", values = "value", aggfunc = "first").reset_index()
+        df.columns.name = None
+    return df
+
+
+def query_results_by_city(poi_source, prune_measure, network = "bikegrown", weighting = None, metrics = None):
+    """Return a dict of placeid: structured array of one result per city, like np.genfromtxt(..., names = True) gives
+    for the result csv files: rows are prune quantiles (or networks for existing infrastructure), fields are metrics.
+    For existing infrastructure use poi_source = "", prune_measure = "", network = None.
+    Raises ValueError if the results table has no results of this parameter set at all.
+    """
+    filters = {"poi_source": poi_source, "prune_measure": prune_measure, "weighted": int(bool(weighting))}
+    if network is not None: filters["network"] = network
+    if metrics is not None: filters["metric"] = metrics
+    df = query_results(**filters)
+    if df.empty:
+        raise ValueError("No results for " + str(filters) + " in " + PATH["results"] + "results.sqlite. Run 04, which adds them with ingest_results, "
+                         + "or ingest_result_csvs for results computed before the results table existed")
+    return {placeid: dfcity.sort_values(["network", "quantile"]).drop(columns = ["placeid", "poi_source", "prune_measure", "weighted", "network", "quantile"]).to_records(index = False)
+            for placeid, dfcity in df.groupby("placeid")}
 
 
 
@@ -1657,21 +3004,16 @@ def greedy_triangulation_polygon_routing(G, pois, weighting=None, prune_quantile
     if len(pois) < 2: return ([], []) # We can't do anything with less than 2 POIs
 
     # GT_abstract is the GT with same nodes but euclidian links to keep track of edge crossings
-    pois_indices = set()
-    for poi in pois:
-        pois_indices.add(G.vs.find(id = poi).index)
-    G_temp = copy.deepcopy(G)
-    for e in G_temp.es: # delete all edges
-        G_temp.es.delete(e)
+    pois_indices = set(poi_vertex_indices(G, pois))
         
     poipairs = poipairs_by_distance(G, pois, weighting, True)
     if len(poipairs) == 0: return ([], [])
 
     if prune_measure == "random":
         # run the whole GT first
-        GT = copy.deepcopy(G_temp.subgraph(pois_indices))
+        GT = abstract_graph(G, pois_indices)
         for poipair, poipair_distance in poipairs:
-            poipair_ind = (GT.vs.find(id = poipair[0]).index, GT.vs.find(id = poipair[1]).index)
+            poipair_ind = (vertex_index(GT, poipair[0]), vertex_index(GT, poipair[1]))
             if not new_edge_intersects(GT, (GT.vs[poipair_ind[0]]["x"], GT.vs[poipair_ind[0]]["y"], GT.vs[poipair_ind[1]]["x"], GT.vs[poipair_ind[1]]["y"])):
                 GT.add_edge(poipair_ind[0], poipair_ind[1], weight = poipair_distance)
         # create a random order for the edges
@@ -1683,7 +3025,7 @@ def greedy_triangulation_polygon_routing(G, pois, weighting=None, prune_quantile
     GT_abstracts = []
     GTs = []
     for prune_quantile in tqdm(prune_quantiles, desc = "Greedy triangulation", leave = False):
-        GT_abstract = copy.deepcopy(G_temp.subgraph(pois_indices))
+        GT_abstract = abstract_graph(G, pois_indices)
         GT_abstract = greedy_triangulation(GT_abstract, poipairs, prune_quantile, prune_measure, edgeorder)
         GT_abstracts.append(GT_abstract)
         
@@ -1696,16 +3038,16 @@ def greedy_triangulation_polygon_routing(G, pois, weighting=None, prune_quantile
         # Do the routing
         GT_indices = set()
         for poipair, poipair_distance in routenodepairs:
-            poipair_ind = (G.vs.find(id = poipair[0]).index, G.vs.find(id = poipair[1]).index)
+            poipair_ind = (vertex_index(G, poipair[0]), vertex_index(G, poipair[1]))
             # debug
             #print(f"Edge weights before routing: {G.es['weight'][:10]}")  # Prints first 10 weights
             #print(f"Routing between: {poipair[0]} and {poipair[1]} with distance: {poipair_distance}")
-            sp = set(G.get_shortest_paths(poipair_ind[0], poipair_ind[1], weights = "weight", output = "vpath")[0])
+            sp = set(G.get_shortest_paths(poipair_ind[0], poipair_ind[1], weights = cost_column(G, weighting), output = "vpath")[0])
             #print(f"Shortest path between {poipair[0]} and {poipair[1]}: {sp}")
 
             GT_indices = GT_indices.union(sp)
 
-        GT = G.induced_subgraph(GT_indices)
+        GT = SubgraphView(G, list(GT_indices))
         GTs.append(GT)
     
     return (GTs, GT_abstracts)
@@ -2103,11 +3445,8 @@ def greedy_triangulation_routing_GT_abstracts(G, pois, weighting=None, prune_qua
     if len(pois) < 2:
         return []  # We can't do anything with less than 2 POIs
 
-    # Initialize the POI indices and an empty copy of G
-    pois_indices = {G.vs.find(id=poi).index for poi in pois}
-    G_temp = copy.deepcopy(G)
-    for e in G_temp.es:
-        G_temp.es.delete(e)  # Delete all edges in G_temp
+    # Initialize the POI indices
+    pois_indices = set(poi_vertex_indices(G, pois))
 
     poipairs = poipairs_by_distance(G, pois, weighting, True)
     if not poipairs:
@@ -2116,11 +3455,11 @@ def greedy_triangulation_routing_GT_abstracts(G, pois, weighting=None, prune_qua
     # If prune_measure is "random", define edge order
     edgeorder = False
     if prune_measure == "random":
-        GT = copy.deepcopy(G_temp.subgraph(pois_indices))
+        GT = abstract_graph(G, pois_indices)
         for poipair, poipair_distance in poipairs:
             poipair_ind = (
-                GT.vs.find(id=poipair[0]).index, 
-                GT.vs.find(id=poipair[1]).index
+                vertex_index(GT, poipair[0]), 
+                vertex_index(GT, poipair[1])
             )
             if not new_edge_intersects(
                 GT, (
@@ -2139,7 +3478,7 @@ def greedy_triangulation_routing_GT_abstracts(G, pois, weighting=None, prune_qua
     # Generate GT_abstracts for each prune_quantile
     GT_abstracts = []
     for prune_quantile in tqdm(prune_quantiles, desc="Greedy triangulation", leave=False):
-        GT_abstract = copy.deepcopy(G_temp.subgraph(pois_indices))
+        GT_abstract = abstract_graph(G, pois_indices)
         GT_abstract = greedy_triangulation(GT_abstract, poipairs, prune_quantile, prune_measure, edgeorder)
         GT_abstracts.append(GT_abstract)
     
@@ -2815,33 +4154,18 @@ def gdf_to_nx_graph(gdf):
 
     Returns:
     NetworkX MultiDiGraph: A NetworkX graph with nodes as 'start_osmid' and 'end_osmid', and edge attributes.
+    The nodes get the lon/lat of the edge endpoints as x and y, like osmnx graphs.
     """
     GT_abstract_nx = nx.MultiDiGraph()
 
-    # Add edges to the graph manually using start_osmid and end_osmid
-    for _, row in gdf.iterrows():
-        u = row['start_osmid']
-        v = row['end_osmid']
-        data = {
-            'geometry': row['geometry'],
-            'weight': row['weight'],
-            'betweeness': row['betweeness']
-        }
-        GT_abstract_nx.add_edge(u, v, **data)
-
-    return GT_abstract_nx
-
+    # Add all edges at once from the columns start_osmid and end_osmid
+    data = [{'geometry': g, 'weight': w, 'betweeness': b} for g, w, b in zip(gdf['geometry'], gdf['weight'].tolist(), gdf['betweeness'].tolist())]
+    GT_abstract_nx.add_edges_from(zip(gdf['start_osmid'].tolist(), gdf['end_osmid'].tolist(), data))
 
+    # Node coordinates from the first and last points of the edge geometries, in lon/lat
+    lonlat = gdf['geometry'].to_crs('EPSG:4326') if gdf.crs is not None else gdf['geometry']
+    for u, v, g in zip(gdf['start_osmid'].tolist(), gdf['end_osmid'].tolist(), lonlat):
+        GT_abstract_nx.nodes[u]['x'], GT_abstract_nx.nodes[u]['y'] = g.coords[0]
+        GT_abstract_nx.nodes[v]['x'], GT_abstract_nx.nodes[v]['y'] = g.coords[-1]
 
-def deweight_edges(GT, tag_lts):
-    """
-    Undo the edge weighting by dividing the 'length' attribute by the LTS value.
-    Operates only on the GT subgraph (not the original G_weighted graph).
-    The division is based on the 'highway' attribute using the LTS values in `tag_lts`.
-    """
-    for u, v, key, data in GT.edges(keys=True, data=True):
-        highway = data.get('highway')  # Get the highway type
-        if highway:
-            lts = tag_lts.get(highway, 1)  # Get LTS value for the highway, defaulting to 1
-            if lts > 0:  # Ensure valid LTS value (non-zero)
-                data['length'] /= lts  # Divide length by the LTS value to undo the modification
+    return GT_abstract_nx
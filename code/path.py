@@ -8,6 +8,7 @@ PATH["results_constricted"] = "../../bikenwgrowth_external/results_constricted/"
 PATH["videos"] = "../../bikenwgrowth_external/videos/"
 PATH["exports"] = "../../bikenwgrowth_external/exports/"
 PATH["exports_json"] = "../../bikenwgrowth_external/exports_json/"
+PATH["exports_gpkg"] = "../../bikenwgrowth_external/exports_gpkg/"
 PATH["logs"] = "../../bikenwgrowth_external/logs/"
 
 print("Loaded PATH.\n")
\ No newline at end of file
@@ -1,6 +1,7 @@
 # System
 import copy
 import csv
+import io
 import sys
 import os
 import watermark
@@ -8,12 +9,22 @@ import pickle
 import itertools
 import random
 import zipfile
+import hashlib
+import mmap
+import fcntl
+import contextlib
+import sqlite3
+import re
+import xml.etree.ElementTree as ET
 from collections import defaultdict
 import pprint
 pp = pprint.PrettyPrinter(indent=4)
 from tqdm.notebook import tqdm
 import warnings
 import shutil
+import threading
+import concurrent.futures
+import multiprocessing
 
 # Math/Data
 import math
@@ -40,7 +51,7 @@ ox.settings.requests_timeout = 300
 ox.settings.logs_folder = PATH["logs"]
 import fiona
 import shapely
-from osgeo import gdal, osr
+from osgeo import gdal, osr, ogr
 from haversine import haversine, haversine_vector
 import pyproj
 from shapely.geometry import Point, MultiPoint, LineString, Polygon, MultiLineString, MultiPolygon, shape, GeometryCollection
@@ -5,6 +5,9 @@ prune_measure = "betweenness" # betweenness, closeness, random
 weighting = True # True, False
 
 SERVER = False # Whether the code runs on the server (important to avoid parallel job conflicts)
+usegraphcache = True # Whether to load networks from a binary cache next to the zipped csv files (rebuilt automatically when stale)
+uselocalextract = False # Whether 01 builds the networks from a local OSM extract <placeid>.osm.pbf (or .osm) in the city's data folder instead of downloading them from Overpass
+usestagecache = True # Whether to skip pipeline stages (03, 04, 05) whose inputs, parameters and code did not change since their last run
 
 
 # SEMI-CONSTANTS
@@ -15,6 +18,10 @@ prune_measures = {"betweenness": "Bq", "closeness": "Cq", "random": "Rq"}
 prune_quantiles = [x/40 for x in list(range(1, 41))] # The quantiles where the GT should be pruned using the prune_measure
 networktypes = ["biketrack", "carall", "bikeable", "biketrackcarall", "biketrack_onstreet", "bikeable_offstreet"] # Existing infrastructures to analyze
 
+# 01
+csvchunksize = 100000 # Number of rows formatted at once when streaming node/edge csv files into their zip files
+csvwriteworkers = 4 # Number of networks of one city written to disk at the same time
+
 # 02
 gridl = 1707 # in m, for generating the grid
 # https://en.wikipedia.org/wiki/Right_triangle#Circumcircle_and_incircle
@@ -28,6 +35,10 @@ poiparameters = {"railwaystation":{'railway':['station','halt']}#, # should mayb
 # 04
 buffer_walk = 500 # Buffer in m for coverage calculations. (How far people are willing to walk)
 numnodepairs = 500 # Number of node pairs to consider for random sample to calculate directness (O(numnodepairs^2), so better not go over 1000)
+coverprecision = None # Grid size in degrees to snap cover coordinates to when writing them, e.g. 1e-6 (about 0.1 m). None keeps full precision
+
+# 09
+backfillworkers = 4 # Number of processes calculating backfilled metrics of the prune quantiles of one result at the same time
 
 #05
 nodesize_grown = 7.5
@@ -85,12 +96,34 @@ osmnxparameters = {'car30': {'network_type':'drive', 'custom_filter':'["maxspeed
                    'bike_bicycleroad': {'network_type':'bike', 'custom_filter':'["bicycle_road"]', 'export': False, 'retain_all': True},
                    'bike_livingstreet': {'network_type':'bike', 'custom_filter':'["highway"~"living_street"]', 'export': False, 'retain_all': True}
                   }  
+osmnetworkfilters = {'drive': '["highway"]["area"!~"yes"]["access"!~"private"]["highway"!~"abandoned|bridleway|bus_guideway|construction|corridor|cycleway|elevator|escalator|footway|no|path|pedestrian|planned|platform|proposed|raceway|razed|service|steps|track"]["motor_vehicle"!~"no"]["motorcar"!~"no"]["service"!~"alley|driveway|emergency_access|parking|parking_aisle|private"]',
+                     'bike': '["highway"]["area"!~"yes"]["access"!~"private"]["highway"!~"abandoned|bus_guideway|construction|corridor|elevator|escalator|footway|motor|no|planned|platform|proposed|raceway|razed|steps"]["bicycle"!~"no"]["service"!~"private"]',
+                     'all': '["highway"]["area"!~"yes"]["access"!~"private"]["highway"!~"abandoned|construction|no|planned|platform|proposed|raceway|razed"]["service"!~"private"]'
+                    } # Overpass filters of the osmnx network types, used for networks without custom_filter when building graphs from a local OSM extract
 # Special case 'biketrack': "cycleway"~"track" OR "highway"~"cycleway" OR "bicycle"~"designated" OR "cycleway:right=track" OR "cycleway:left=track" OR ("highway"~"path" AND "bicycle"~"designated") OR "cyclestreet" OR "highway"~"living_street"
 # Special case 'bikeable': biketrack OR car30
 # See: https://wiki.openstreetmap.org/wiki/Key:cycleway#Cycle_tracks
 # https://wiki.openstreetmap.org/wiki/Tag:highway=path#Usage_as_a_universal_tag
 # https://wiki.openstreetmap.org/wiki/Tag:highway%3Dliving_street
 # https://wiki.openstreetmap.org/wiki/Key:cyclestreet
+networkcompositions = {"biketrack": ("or", ['bike_cyclewaylefttrack', 'bike_cyclewaytrack', 'bike_highwaycycleway', 'bike_bicycleroad', 'bike_cyclewayrighttrack', 'bike_designatedpath', 'bike_cyclestreet']),
+                       "bikeable": ("or", ['biketrack', 'car30', 'bike_livingstreet']),
+                       "biketrackcarall": ("or", ['biketrack', 'carall']),
+                       "biketrack_onstreet": ("and", ['biketrack', 'carall']),
+                       "bikeable_offstreet": ("andnot", ['bikeable', 'carall'])
+                      } # Networks derived as edge masks over the union of the queried networks, in this order: "or" is the union of the networks' edges, "and" keeps the edges of the first network also in the others, "andnot" those in none of the others. "and" and "andnot" match edges by their node pairs, like intersect_igraphs and delete_overlaps
+
+# Graph loading
+graphcache_columns = {"nodes": ["osmid", "x", "y"], # Columns of the _nodes.csv/_edges.csv files kept in the binary graph cache
+                      "edges": ["u", "v", "osmid", "length", "maxspeed", "highway"]}
+graphcache_version = 1 # Increase to invalidate all existing graph caches
+
+# Edge costs
+defaultmaxspeed = 20 # Speed limit assumed in the speed-weighted cost of edges without maxspeed
+tag_lts = {"motorway": 4, "motorway_link": 4, "trunk": 4, "trunk_link": 4, "primary": 4, "primary_link": 4, "secondary": 4, "secondary_link": 4,
+           "tertiary": 3, "tertiary_link": 3, "unclassified": 3,
+           "residential": 2, "living_street": 2,
+           "cycleway": 1, "track": 1, "path": 1, "bridleway": 1} # Level of traffic stress (LTS) per highway tag in the LTS-weighted cost, other tags count as 1
 
 
 # 02
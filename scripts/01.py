@@ -1,64 +1,58 @@
 for placeid, placeinfo in tqdm(cities.items(), desc = "Cities"):
-    if placeinfo["nominatimstring"] != '':
-        location = ox.geocoder.geocode_to_gdf(placeinfo["nominatimstring"])
-        location = fill_holes(extract_relevant_polygon(placeid, shapely.geometry.shape(location['geometry'][0])))
-        if debug: # Draw location polygons and their holes
-            try:
-                color = cm.rainbow(np.linspace(0,1,len(location)))
-                for poly,c in zip(location, color):
-                    plt.plot(*poly.exterior.xy, c = c)
-                    for intr in poly.interiors:
-                        plt.plot(*intr.xy, c = "red")
-            except:
-                plt.plot(*location.exterior.xy)
-            plt.show()
-    else:
-        # https://gis.stackexchange.com/questions/113799/how-to-read-a-shapefile-in-python
-        shp = fiona.open(PATH["data"] + placeid + "/" + placeid + ".shp")
-        first = next(iter(shp))
-        location = shapely.geometry.shape(first['geometry'])
+    location = load_location(placeid, placeinfo)
+    if debug: # Draw location polygons and their holes
+        try:
+            color = cm.rainbow(np.linspace(0,1,len(location)))
+            for poly,c in zip(location, color):
+                plt.plot(*poly.exterior.xy, c = c)
+                for intr in poly.interiors:
+                    plt.plot(*intr.xy, c = "red")
+        except:
+            plt.plot(*location.exterior.xy)
+        plt.show()
     
-    Gs = {}
-    for parameterid, parameterinfo in tqdm(osmnxparameters.items(), desc = "Networks", leave = False):
-        for i in range(0,10): # retry
-            try:
-                Gs[parameterid] = ox.graph_from_polygon(location, 
-                                       network_type = parameterinfo['network_type'],
-                                       custom_filter = (parameterinfo['custom_filter']),
-                                       retain_all = parameterinfo['retain_all'],
-                                       simplify = False)
-            except ValueError:
-                Gs[parameterid] = nx.empty_graph(create_using = nx.MultiDiGraph)
-                print(placeid + ": No OSM data for graph " + parameterid + ". Created empty graph.")
+    if uselocalextract: # Read all networks from the local OSM extract in one pass
+        Gs = graphs_from_osm_extract(osm_extract_file(placeid), location, placeid)
+    else:
+        Gs = {}
+        for parameterid, parameterinfo in tqdm(osmnxparameters.items(), desc = "Networks", leave = False):
+            for i in range(0,10): # retry
+                try:
+                    Gs[parameterid] = ox.graph_from_polygon(location, 
+                                           network_type = parameterinfo['network_type'],
+                                           custom_filter = (parameterinfo['custom_filter']),
+                                           retain_all = parameterinfo['retain_all'],
+                                           simplify = False)
+                except ValueError:
+                    Gs[parameterid] = nx.empty_graph(create_using = nx.MultiDiGraph)
+                    print(placeid + ": No OSM data for graph " + parameterid + ". Created empty graph.")
+                    break
+                except ConnectionError or UnboundLocalError:
+                    print("ConnectionError or UnboundLocalError. Retrying.")
+                    continue
+                except:
+                    print("Other error. Retrying.")
+                    continue
                 break
-            except ConnectionError or UnboundLocalError:
-                print("ConnectionError or UnboundLocalError. Retrying.")
-                continue
-            except:
-                print("Other error. Retrying.")
-                continue
-            break
-        if parameterinfo['export']: ox_to_csv(Gs[parameterid], PATH["data"] + placeid + "/", placeid, parameterid)
 
-    # Compose special cases biketrack, bikeable, biketrackcarall
-    parameterid = 'biketrack'
-    Gs[parameterid] = nx.compose_all([Gs['bike_cyclewaylefttrack'], Gs['bike_cyclewaytrack'], Gs['bike_highwaycycleway'], Gs['bike_bicycleroad'], Gs['bike_cyclewayrighttrack'], Gs['bike_designatedpath'], Gs['bike_cyclestreet']])
-    ox_to_csv(Gs[parameterid], PATH["data"] + placeid + "/", placeid, parameterid)
-    
-    parameterid = 'bikeable'
-    Gs[parameterid] = nx.compose_all([Gs['biketrack'], Gs['car30'], Gs['bike_livingstreet']]) 
-    ox_to_csv(Gs[parameterid], PATH["data"] + placeid + "/", placeid, parameterid)
-    
-    parameterid = 'biketrackcarall'
-    Gs[parameterid] = nx.compose(Gs['biketrack'], Gs['carall']) # Order is important
-    ox_to_csv(Gs[parameterid], PATH["data"] + placeid + "/", placeid, parameterid)
-        
-    for parameterid in networktypes[:-2]:
-        #G_temp = nx.MultiDiGraph(ox.utils_graph.get_digraph(ox.simplify_graph(Gs[parameterid]))) # This doesnt work - cant get rid of multiedges
-        ox_to_csv(ox.simplify_graph(Gs[parameterid]), PATH["data"] + placeid + "/", placeid, parameterid, "_simplified")
+    # Compose all networks into one union graph, with every network as an edge mask over it.
+    # The special cases biketrack, bikeable, biketrackcarall, biketrack_onstreet and bikeable_offstreet are mask algebra (see networkcompositions)
+    # Only the union graph and the masks are written, the loaders select the networks from them (see read_graph_tables)
+    G_union, edges, masks = compose_networks(Gs)
+    G_union.graph.setdefault("crs", 'epsg:4326') # needed for OSMNX's graph_to_gdfs in utils_graph.py
+    try:
+        union = ox.graph_to_gdfs(G_union)
+    except ValueError: # No networks at all
+        union = (gpd.GeoDataFrame(), gpd.GeoDataFrame())
+    G_union = None
+    write_network_masks(masks, PATH["data"] + placeid + "/", placeid)
 
-# Compress all data files (will not do anything if files were compressed already)
-for folder, subfolders, files in os.walk(PATH["data"]):
-    for file in files:
-        if file.endswith('es.csv'):
-            compress_file(folder + "/", file.split(".")[0])
\ No newline at end of file
+    # Write the union and the simplified networks concurrently, streaming them directly into their zip files.
+    # Each simplified network is simplified from its own graph, as the composition of its networks. biketrack_onstreet and
+    # bikeable_offstreet are not simplified here, 04 derives them from the simplified networks.
+    # The jobs are generators, so each network is only built when a writer is free and dropped once it is written
+    #G_temp = nx.MultiDiGraph(ox.utils_graph.get_digraph(ox.simplify_graph(Gs[parameterid]))) # This doesnt work - cant get rid of multiedges
+    simplified = [parameterid for parameterid in networktypes if parameterid in Gs or networkcompositions[parameterid][0] == "or"]
+    jobs = itertools.chain([(union, "union", "")],
+                           ((ox.simplify_graph(network_graph(Gs, parameterid)), parameterid, "_simplified") for parameterid in simplified))
+    ox_to_csv_concurrent(jobs, PATH["data"] + placeid + "/", placeid)
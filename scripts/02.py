@@ -7,14 +7,7 @@ parameterinfo = osmnxparameters['carall']
 for placeid, placeinfo in tqdm(cities.items(), desc = "Cities"):
     print(placeid + ": Loading location polygon and carall graph")
     
-    if placeinfo["nominatimstring"] != '':
-        location = ox.geocoder.geocode_to_gdf(placeinfo["nominatimstring"])
-        location = fill_holes(extract_relevant_polygon(placeid, shapely.geometry.shape(location['geometry'][0])))
-    else:
-        # https://gis.stackexchange.com/questions/113799/how-to-read-a-shapefile-in-python
-        shp = fiona.open(PATH["data"] + placeid + "/" + placeid + ".shp")
-        first = next(iter(shp))
-        location = shapely.geometry.shape(first['geometry'])
+    location = load_location(placeid, placeinfo)
     locations[placeid] = location
     
     G_caralls[placeid] = csv_to_ox(PATH["data"] + placeid + "/", placeid, 'carall')
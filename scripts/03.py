@@ -1,17 +1,25 @@
 for placeid, placeinfo in cities.items():
     print(placeid + ": Generating networks")
 
+    # Skip if nothing the generation depends on changed since the last run
+    stage = "03_poi_" + poi_source + "_" + prune_measure
+    stagekey = stage_key(graph_source_files(PATH["data"] + placeid + "/", placeid, 'carall') + [PATH["data"] + placeid + "/" + placeid + '_poi_' + poi_source + '_nnidscarall.csv'], 
+                         {"poi_source": poi_source, "prune_measure": prune_measure, "prune_quantiles": prune_quantiles}, ["03.py"])
+    if stage_is_current(PATH["results"] + placeid + "/", placeid, stage, stagekey, [PATH["results"] + placeid + "/" + result_filename(placeid, poi_source, prune_measure, "_growth.npz")]):
+        print(placeid + ": Inputs unchanged, skipping")
+        continue
+
     # Load networks
     G_carall = csv_to_ig(PATH["data"] + placeid + "/", placeid, 'carall')
     
     # Load POIs
-    with open(PATH["data"] + placeid + "/" + placeid + '_poi_' + poi_source + '_nnidscarall.csv') as f:
-        nnids = [int(line.rstrip()) for line in f]
+    nnids = load_pois(PATH["data"] + placeid + "/", placeid, poi_source, G_carall)
     
     # Generation
-    (GTs, GT_abstracts) = greedy_triangulation_routing(G_carall, nnids, prune_quantiles, prune_measure)
+    (GTs, GT_abstracts) = greedy_triangulation_routing(G_carall, nnids, prune_quantiles = prune_quantiles, prune_measure = prune_measure)
     (MST, MST_abstract) = mst_routing(G_carall, nnids)
     
     # Write results
     results = {"placeid": placeid, "prune_measure": prune_measure, "poi_source": poi_source, "prune_quantiles": prune_quantiles, "GTs": GTs, "GT_abstracts": GT_abstracts, "MST": MST, "MST_abstract": MST_abstract}
-    write_result(results, "pickle", placeid, poi_source, prune_measure, ".pickle")
+    write_result_growth(results, placeid, poi_source, prune_measure, G_carall)
+    stage_done(PATH["results"] + placeid + "/", placeid, stage, stagekey)
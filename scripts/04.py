@@ -1,13 +1,15 @@
 warnings.filterwarnings('ignore')
-rerun_existing = True
+rerun_existing = False # Rerun the existing infrastructure analysis even if none of its inputs changed
 
 for placeid, placeinfo in cities.items():
     print(placeid + ": Analyzing existing infrastructure.")
     
     # output_place is one static file for the existing city. This can be compared to the generated infrastructure.
     # Make a check if this file was already generated - it only needs to be done once. If not, generate it:
-    filename = placeid + "_existing.csv"
-    if rerun_existing or not os.path.isfile(PATH["results"] + placeid + "/" + filename):
+    filename = result_filename(placeid, "", "", "existing.csv") # As written by write_result below
+    stagekey = stage_key([f for networktype in networktypes for postfix in ["", "_simplified"] for f in graph_source_files(PATH["data"] + placeid + "/", placeid, networktype + postfix)] + [PATH["data"] + placeid + "/" + placeid + '_poi_' + poi_source + '_nnidscarall.csv'], 
+                         {"networktypes": networktypes, "buffer_walk": buffer_walk, "numnodepairs": numnodepairs}, ["04.py"])
+    if rerun_existing or not stage_is_current(PATH["results"] + placeid + "/", placeid, "04_existing", stagekey, [PATH["results"] + placeid + "/" + filename, PATH["results"] + placeid + "/" + placeid + "_existing_covers.wkb"]):
         empty_metrics = {
                          "length":0,
                          "length_lcc":0,
@@ -30,22 +32,26 @@ for placeid, placeinfo in cities.items():
         # Analyze all networks     
         Gs = {}
         for networktype in networktypes:
-            if networktype != "biketrack_onstreet" and networktype != "bikeable_offstreet":
+            if networktype not in ["biketrack_onstreet", "bikeable_offstreet"]:
                 Gs[networktype] = csv_to_ig(PATH["data"] + placeid + "/", placeid, networktype)
                 Gs[networktype + "_simplified"] = csv_to_ig(PATH["data"] + placeid + "/", placeid, networktype + "_simplified")
-            elif networktype == "biketrack_onstreet":
-                Gs[networktype] = intersect_igraphs(Gs["biketrack"], Gs["carall"])
-                Gs[networktype + "_simplified"] = intersect_igraphs(Gs["biketrack_simplified"], Gs["carall_simplified"])
+                continue
+            # 01 stores the derived networks as edge masks, but not their simplified versions, which are derived here
+            suffixes = ["_simplified"]
+            if graph_source_files(PATH["data"] + placeid + "/", placeid, networktype):
+                Gs[networktype] = csv_to_ig(PATH["data"] + placeid + "/", placeid, networktype)
+            else: # Data written before 01 stored them
+                suffixes = [""] + suffixes
+            if networktype == "biketrack_onstreet":
+                for suffix in suffixes:
+                    Gs[networktype + suffix] = intersect_igraphs(Gs["biketrack" + suffix], Gs["carall" + suffix])
             elif networktype == "bikeable_offstreet":
-                G_temp = copy.deepcopy(Gs["bikeable"])
-                delete_overlaps(G_temp, Gs["carall"])
-                Gs[networktype] = G_temp
-                G_temp = copy.deepcopy(Gs["bikeable_simplified"])
-                delete_overlaps(G_temp, Gs["carall_simplified"])
-                Gs[networktype + "_simplified"] = G_temp
+                # Keep the bikeable edges that are not in carall, without copying bikeable first
+                for suffix in suffixes:
+                    offstreet = ~delete_overlaps(Gs["bikeable" + suffix], Gs["carall" + suffix], mask = True)
+                    Gs[networktype + suffix] = Gs["bikeable" + suffix].subgraph_edges(np.flatnonzero(offstreet).tolist(), delete_vertices = True)
         
-        with open(PATH["data"] + placeid + "/" + placeid + '_poi_' + poi_source + '_nnidscarall.csv') as f:
-            nnids = [int(line.rstrip()) for line in f]
+        nnids = load_pois(PATH["data"] + placeid + "/", placeid, poi_source, Gs["carall"])
 
             
         covs = {}
@@ -56,16 +62,28 @@ for placeid, placeinfo in cities.items():
                 output_place[networktype][key] = val
             covs[networktype] = cov
         # Save the covers
-        write_result(covs, "pickle", placeid, "", "", "existing_covers.pickle")
+        write_covers(covs, placeid, placeid + "_existing_covers.wkb")
         
         # Write to CSV
         write_result(output_place, "dictnested", placeid, "", "", "existing.csv", empty_metrics)
+        for networktype in networktypes:
+            ingest_results(output_place[networktype], placeid, "", "", networktype)
+        stage_done(PATH["results"] + placeid + "/", placeid, "04_existing", stagekey)
 
 
 
 for placeid, placeinfo in cities.items():
     print(placeid + ": Analyzing results")
 
+    # Skip if nothing the analysis depends on changed since the last run
+    stage = "04_poi_" + poi_source + "_" + prune_measure
+    stagekey = stage_key([f for networktype in ["carall", "biketrack", "bikeable"] for f in graph_source_files(PATH["data"] + placeid + "/", placeid, networktype)] + [PATH["data"] + placeid + "/" + placeid + '_poi_' + poi_source + '_nnidscarall.csv'] 
+                         + [PATH["results"] + placeid + "/" + result_filename(placeid, poi_source, prune_measure, suffix) for suffix in ["_growth.npz", ".pickle"]], 
+                         {"buffer_walk": buffer_walk, "numnodepairs": numnodepairs}, ["04.py"])
+    if stage_is_current(PATH["results"] + placeid + "/", placeid, stage, stagekey, [PATH["results"] + placeid + "/" + result_filename(placeid, poi_source, prune_measure, suffix) for suffix in ["_covers.wkb", "_cover_mst.wkb", ".csv"]]):
+        print(placeid + ": Inputs unchanged, skipping")
+        continue
+
     # Load networks
     G_carall = csv_to_ig(PATH["data"] + placeid + "/", placeid, 'carall')
     Gexisting = {}
@@ -74,14 +92,10 @@ for placeid, placeinfo in cities.items():
         
     
     # Load POIs
-    with open(PATH["data"] + placeid + "/" + placeid + '_poi_' + poi_source + '_nnidscarall.csv') as f:
-        nnids = [int(line.rstrip()) for line in f]
+    nnids = load_pois(PATH["data"] + placeid + "/", placeid, poi_source, G_carall)
             
     # Load results
-    filename = placeid + '_poi_' + poi_source + "_" + prune_measure
-    resultfile = open(PATH["results"] + placeid + "/" + filename + ".pickle",'rb')
-    res = pickle.load(resultfile)
-    resultfile.close()
+    res = load_result_growth(placeid, poi_source, prune_measure, G_carall)
     if debug: pp.pprint(res)
          
     # Calculate
@@ -90,12 +104,15 @@ for placeid, placeinfo in cities.items():
     output_MST, cov_MST = calculate_metrics(res["MST"], res["MST_abstract"], G_carall, nnids, output, buffer_walk, numnodepairs, debug, True, ig.Graph(), Polygon(), False, Gexisting)
         
     # Save the covers
-    write_result(covs, "pickle", placeid, poi_source, prune_measure, "_covers.pickle")
+    write_covers(covs, placeid, result_filename(placeid, poi_source, prune_measure, "_covers.wkb"))
 #     write_result(covs_carminusbike, "pickle", placeid, poi_source, prune_measure, "_covers_carminusbike.pickle")
-    write_result(cov_MST, "pickle", placeid, poi_source, prune_measure, "_cover_mst.pickle")
+    write_covers(cov_MST, placeid, result_filename(placeid, poi_source, prune_measure, "_cover_mst.wkb"))
         
     # Write to CSV
     write_result(output, "dict", placeid, poi_source, prune_measure, ".csv")
 #     write_result(output_carminusbike, "dict", placeid, poi_source, prune_measure, "_carminusbike.csv")
 #     write_result(output_carconstrictedbike, "dict", placeid, poi_source, prune_measure, "_carconstrictedbike.csv")
     write_result(output_MST, "dict", placeid, poi_source, "", "mst.csv")
+    ingest_results(output, placeid, poi_source, prune_measure, "bikegrown", res["prune_quantiles"])
+    ingest_results(output_MST, placeid, poi_source, "", "mst")
+    stage_done(PATH["results"] + placeid + "/", placeid, stage, stagekey)
@@ -9,6 +9,15 @@ for placeid, placeinfo in cities.items():
     else:
         weight_abstract = 6
     
+    # Skip if nothing the plots depend on changed since the last run and all plots still exist
+    stage = "05_existing_poi_" + poi_source
+    stagekey = stage_key([f for networktype in ["biketrack", "carall", "biketrackcarall", "bikeable"] for f in graph_source_files(PATH["data"] + placeid + "/", placeid, networktype)] + [PATH["data"] + placeid + "/" + placeid + '_poi_' + poi_source + '_nnidscarall.csv'], 
+                         {"plotparam": plotparam}, ["05.py"])
+    plotfiles = [PATH["plots_networks"] + placeid + "/" + placeid + name + ext for name in ['_carall', '_biketrack', '_bikeable', '_biketrackcarall', '_carall_poi_' + poi_source] for ext in [".pdf", ".png"]]
+    if stage_is_current(PATH["plots_networks"] + placeid + "/", placeid, stage, stagekey, plotfiles):
+        print(placeid + ": Inputs unchanged, skipping")
+        continue
+    
     # EXISTING INFRASTRUCTURE
     # Load networks
     G_biketrack = csv_to_ig(PATH["data"] + placeid + "/", placeid, 'biketrack')
@@ -45,8 +54,7 @@ for placeid, placeinfo in cities.items():
     plt.close()
     
     # Load POIs
-    with open(PATH["data"] + placeid + "/" + placeid + '_poi_' + poi_source + '_nnidscarall.csv') as f:
-        nnids = [int(line.rstrip()) for line in f]
+    nnids = load_pois(PATH["data"] + placeid + "/", placeid, poi_source, G_carall)
     nodesize_poi = nodesize_from_pois(nnids)
     
     fig = initplot()
@@ -55,6 +63,7 @@ for placeid, placeinfo in cities.items():
     plt.savefig(PATH["plots_networks"] + placeid + "/" + placeid + '_carall_poi_' + poi_source + '.pdf', bbox_inches="tight")
     plt.savefig(PATH["plots_networks"] + placeid + "/" + placeid + '_carall_poi_' + poi_source + '.png', bbox_inches="tight", dpi=plotparam["dpi"])
     plt.close()
+    stage_done(PATH["plots_networks"] + placeid + "/", placeid, stage, stagekey)
 
 
 
@@ -68,14 +77,24 @@ for placeid, placeinfo in cities.items():
     else:
         weight_abstract = 6
     
+    # Skip if nothing the plots depend on changed since the last run and all plots still exist
+    stage = "05_poi_" + poi_source + "_" + prune_measure
+    stagekey = stage_key(graph_source_files(PATH["data"] + placeid + "/", placeid, 'carall') + [PATH["data"] + placeid + "/" + placeid + '_poi_' + poi_source + '_nnidscarall.csv'] 
+                         + [PATH["results"] + placeid + "/" + result_filename(placeid, poi_source, prune_measure, suffix) for suffix in ["_growth.npz", ".pickle"]], 
+                         {"plotparam": plotparam, "nodesize_grown": nodesize_grown}, ["05.py"])
+    plotfiles = [PATH["plots_networks"] + placeid + "/" + placeid + name + '_poi_' + poi_source + ext for name in ['_carall', '_MSTabstract', '_MSTall', '_MSTabstractall'] for ext in [".pdf", ".png"]]
+    plotfiles += [PATH["plots_networks"] + placeid + "/" + placeid + name + '_poi_' + poi_source + "_" + prune_measures[prune_measure] + "{:.3f}".format(prune_quantile) + '.png' for name in ['_GTabstract', '_GTall'] for prune_quantile in prune_quantiles]
+    if stage_is_current(PATH["plots_networks"] + placeid + "/", placeid, stage, stagekey, plotfiles):
+        print(placeid + ": Inputs unchanged, skipping")
+        continue
+    
     # EXISTING INFRASTRUCTURE
     # Load networks
     G_carall = csv_to_ig(PATH["data"] + placeid + "/", placeid, 'carall')
     map_center = nxdraw(G_carall, "carall")
     
     # Load POIs
-    with open(PATH["data"] + placeid + "/" + placeid + '_poi_' + poi_source + '_nnidscarall.csv') as f:
-        nnids = [int(line.rstrip()) for line in f]
+    nnids = load_pois(PATH["data"] + placeid + "/", placeid, poi_source, G_carall)
     nodesize_poi = nodesize_from_pois(nnids)
     
     fig = initplot()
@@ -88,9 +107,7 @@ for placeid, placeinfo in cities.items():
     
     # GENERATED, POI BASED
     # Load results
-    filename = placeid + '_poi_' + poi_source + "_" + prune_measure + ".pickle"
-    with open(PATH["results"] + placeid + "/" + filename, 'rb') as f:
-        res = pickle.load(f)
+    res = load_result_growth(placeid, poi_source, prune_measure, G_carall)
     if debug: pp.pprint(res)
         
     # PLOT abstract MST
@@ -147,6 +164,7 @@ for placeid, placeinfo in cities.items():
         nxdraw(G_carall, "poi_reached", map_center, list(set([v["id"] for v in GT.vs]).intersection(set(nnids))), "nx.draw_networkx_nodes", nodesize_poi)
         plt.savefig(PATH["plots_networks"] + placeid + "/" + placeid + '_GTall_poi_' + poi_source + "_" + prune_measures[prune_measure] + "{:.3f}".format(prune_quantile) + '.png', bbox_inches="tight", dpi=plotparam["dpi"])
         plt.close()
+    stage_done(PATH["plots_networks"] + placeid + "/", placeid, stage, stagekey)
         
 
 
@@ -155,6 +173,16 @@ for placeid, placeinfo in cities.items():
 for placeid, placeinfo in cities.items():
     print(placeid + ": Plotting network covers")
 
+    # Skip if nothing the plots depend on changed since the last run
+    stage = "05_covers_poi_" + poi_source + "_" + prune_measure
+    stagekey = stage_key(graph_source_files(PATH["data"] + placeid + "/", placeid, 'carall') + [PATH["data"] + placeid + "/" + placeid + '_poi_' + poi_source + '_nnidscarall.csv'] 
+                         + [PATH["results"] + placeid + "/" + result_filename(placeid, poi_source, prune_measure, suffix) for suffix in ["_growth.npz", ".pickle", "_covers.wkb", "_covers.pickle"]] + [PATH["results"] + placeid + "/" + placeid + "_existing_covers" + ext for ext in [".wkb", ".pickle"]], 
+                         {"plotparam": plotparam, "nodesize_grown": nodesize_grown}, ["05.py"])
+    plotfiles = [PATH["plots_networks"] + placeid + "/" + placeid + '_GTallcover_poi_' + poi_source + "_" + prune_measures[prune_measure] + "{:.3f}".format(prune_quantile) + '.png' for prune_quantile in prune_quantiles]
+    if stage_is_current(PATH["plots_networks"] + placeid + "/", placeid, stage, stagekey, plotfiles):
+        print(placeid + ": Inputs unchanged, skipping")
+        continue
+
     # Load networks
     G_biketrack = csv_to_ig(PATH["data"] + placeid + "/", placeid, 'biketrack')
     G_carall = csv_to_ig(PATH["data"] + placeid + "/", placeid, 'carall')
@@ -163,22 +191,16 @@ for placeid, placeinfo in cities.items():
     map_center = nxdraw(G_carall, "carall")
     
     # Load POIs
-    with open(PATH["data"] + placeid + "/" + placeid + '_poi_' + poi_source + '_nnidscarall.csv') as f:
-        nnids = [int(line.rstrip()) for line in f]
+    nnids = load_pois(PATH["data"] + placeid + "/", placeid, poi_source, G_carall)
     nodesize_poi = nodesize_from_pois(nnids)
     
     # Load results
-    filename = placeid + '_poi_' + poi_source + "_" + prune_measure + ".pickle"
-    with open(PATH["results"] + placeid + "/" + filename, 'rb') as f:
-        res = pickle.load(f)
+    res = load_result_growth(placeid, poi_source, prune_measure, G_carall)
     
     # Load covers
-    filename = placeid + '_poi_' + poi_source + "_" + prune_measure + "_covers"
-    with open(PATH["results"] + placeid + "/" + filename + ".pickle",'rb') as f:
-        covs = pickle.load(f)
-    filename = placeid + "_"  + "existing_covers"
-    with open(PATH["results"] + placeid + "/" + filename + ".pickle",'rb') as f:
-        cov_car = pickle.load(f)['carall']
+    covs = load_covers(placeid, result_filename(placeid, poi_source, prune_measure, "_covers.wkb"))
+    with load_covers(placeid, placeid + "_existing_covers.wkb") as covs_existing:
+        cov_car = covs_existing['carall']
     
     # Construct and plot patches from covers
     patchlist_car, patchlist_car_holes = cov_to_patchlist(cov_car, map_center)
@@ -218,3 +240,5 @@ for placeid, placeinfo in cities.items():
         nxdraw(G_carall, "poi_reached", map_center, list(set([v["id"] for v in GT.vs]).intersection(set(nnids))), "nx.draw_networkx_nodes", nodesize_poi)
         plt.savefig(PATH["plots_networks"] + placeid + "/" + placeid + '_GTallcover_poi_' + poi_source + "_" + prune_measures[prune_measure] + "{:.3f}".format(prune_quantile) + '.png', bbox_inches="tight", dpi=plotparam["dpi"])
         plt.close()
+    covs.close()
+    stage_done(PATH["plots_networks"] + placeid + "/", placeid, stage, stagekey)
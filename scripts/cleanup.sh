@@ -1,4 +1,5 @@
 #!/bin/bash
+# Leftovers from older runs: the graph loaders now stream the csv files out of their zip files instead of extracting them
 
 find ~/bikenwgrowth/data/ -type f -name '*_edges.csv' -delete
-find ~/bikenwgrowth/data/ -type f -name '*_nodes.csv' -delete
\ No newline at end of file
+find ~/bikenwgrowth/data/ -type f -name '*_nodes.csv' -delete
@@ -2,28 +2,28 @@ for placeid, placeinfo in cities.items():
     print(placeid + ": Exporting carconstrictedbike to picklez")
     
     # Load existing
-    G_carall = csv_to_ig(PATH["data"] + placeid + "/", placeid, 'carall')
+    G_carall = csv_to_ig(PATH["data"] + placeid + "/", placeid, 'carall') # Unweighted: X_carconstricted_metrics routes on the constricted weight
     with open(PATH["exports"] + placeid + "/" + placeid + '_carall.picklez', 'wb') as f:
         G_carall_simplified = simplify_ig(G_carall)
         G_carall_simplified.write_picklez(fname = f)
     if debug: map_center = nxdraw(G_carall, "carall")
             
     # Load results
-    filename = placeid + '_poi_' + poi_source + "_" + prune_measure
-    resultfile = open(PATH["results"] + placeid + "/" + filename + ".pickle",'rb')
-    res = pickle.load(resultfile)
-    resultfile.close()
+    res = load_result_growth(placeid, poi_source, prune_measure, G_carall)
     
     if debug:
         fig = initplot()
         nxdraw(G_carall_simplified, "abstract", map_center, nodesize = 0, weighted = True, maxwidthsquared = 500)
         plt.savefig(PATH["exports"] + placeid + "/" + placeid + '_carallweighted.png', bbox_inches="tight", dpi=plotparam["dpi"])
         plt.close()
-    for GT, prune_quantile in zip(res["GTs"], res["prune_quantiles"]):
+    for i, prune_quantile in enumerate(res["prune_quantiles"]):
         if prune_quantile in prune_quantiles:
-            GT_carconstrictedbike = copy.deepcopy(G_carall)
-            constrict_overlaps(GT_carconstrictedbike, GT)
-            GT_carconstrictedbike = simplify_ig(GT_carconstrictedbike)
+            GT = res["GTs"][i]
+            # Constrict G_carall in place and restore its weights afterwards, instead of copying it per quantile
+            weights = G_carall.es["weight"]
+            constrict_overlaps(G_carall, GT)
+            GT_carconstrictedbike = simplify_ig(G_carall)
+            G_carall.es["weight"] = weights
             if debug:
                 fig = initplot()
                 nxdraw(GT_carconstrictedbike, "abstract", map_center, nodesize = 0, weighted = True, maxwidthsquared = 500)
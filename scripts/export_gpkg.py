@@ -0,0 +1,46 @@
+for placeid, placeinfo in cities.items():
+    print(placeid + ": Exporting networks and results to GeoPackage")
+    layers = {}
+
+    # Existing networks: the layers carry the length as weight and, with weighting, also its cost column
+    columns = ["osmid", "weight"] + ([weighting_column(weighting)] if weighting else [])
+    Gs = {}
+    for networktype in networktypes:
+        for nw in [networktype, networktype + "_simplified"]:
+            if nw == networktype or graph_source_files(PATH["data"] + placeid + "/", placeid, nw): # 01 does not write the simplified biketrack_onstreet and bikeable_offstreet
+                Gs[nw] = csv_to_ig(PATH["data"] + placeid + "/", placeid, nw, weighting = weighting)
+    for nw, G in Gs.items():
+        layers[nw] = ig_to_gdf(G, columns)
+    
+    # Results: all grown networks are subgraphs of carall, so their layers are selections of its edges
+    G_carall = Gs["carall"]
+    gdf_carall = layers["carall"]
+    resultlayers = 0
+    for poi_source, prune_measure in parsets_used:
+        res, reason = None, "no results"
+        for w in ([weighting, None] if weighting else [None]):
+            try:
+                res = load_result_growth(placeid, poi_source, prune_measure, G_carall, w)
+                break
+            except FileNotFoundError:
+                pass
+            except ValueError as err: # The result was generated on another version of carall
+                reason = str(err)
+        if res is None:
+            print(placeid + ": Skipping " + poi_source + " " + prune_measure + ": " + reason)
+            continue
+        for i, prune_quantile in enumerate(res["prune_quantiles"]):
+            layername = 'GTbonly_poi_' + poi_source + "_" + prune_measures[prune_measure] + "{:.3f}".format(prune_quantile) + ("_weighted" if w else "")
+            if isinstance(res["GTs"], GrowthSequence):
+                layers[layername] = gdf_carall.iloc[res["GTs"].edge_indices(i)]
+            else:
+                layers[layername] = ig_to_gdf(res["GTs"][i], columns)
+            resultlayers += 1
+
+    if not resultlayers:
+        print(placeid + ": No result layers, exporting only the existing networks")
+    if not layers:
+        print(placeid + ": No layers, nothing to export")
+        continue
+    os.makedirs(PATH["exports_gpkg"], exist_ok = True)
+    write_gpkg(layers, PATH["exports_gpkg"] + placeid + ".gpkg")
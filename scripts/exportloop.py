@@ -27,4 +27,7 @@ if __name__ == '__main__':
         print(poi_source, prune_measure)
 
         print("Running export_carconstrictedbikes.py")
-        exec(open("export_carconstrictedbikes.py").read())
\ No newline at end of file
+        exec(open("export_carconstrictedbikes.py").read())
+
+    print("Running export_gpkg.py")
+    exec(open("export_gpkg.py").read())
\ No newline at end of file
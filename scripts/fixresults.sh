@@ -1,6 +1,7 @@
 #!/bin/bash
 # This script takes from all poi+metric results csv files the header and the last 40 rows,
-# fixing the problem of appended results when SLURM jobs of same cities were repeated
+# fixing the problem of appended results when SLURM jobs of same cities were repeated.
+# Results are now written atomically under a lock (see write_result_file), so this is only needed for older results.
 
 # https://stackoverflow.com/questions/9612090/how-to-loop-through-file-names-returned-by-find
 #shopt -s globstar
@@ -0,0 +1,104 @@
+"""Tests of backfill_metrics. Run with pytest from the repository root.
+The code is loaded the way the scripts load it, so the full environment (environment.yml) is needed.
+"""
+import os
+import sys
+import types
+
+import pytest
+
+for module in ["osmnx", "shapely", "geopandas", "haversine", "tesspy", "momepy"]:
+    pytest.importorskip(module)
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def ns(tmp_path, monkeypatch):
+    """Namespace of parameters.py, path.py, setup.py and functions.py, with all paths in tmp_path.
+    It is the namespace of a registered module, so the worker processes of backfill_metrics can unpickle its functions.
+    """
+    monkeypatch.chdir(os.path.join(REPO, "scripts"))
+    module = types.ModuleType("bikenwgrowth")
+    monkeypatch.setitem(sys.modules, module.__name__, module)
+    ns = vars(module)
+    ns["debug"] = False
+    exec(open("../parameters/parameters.py").read(), ns)
+    exec(open("../code/path.py").read(), ns)
+    for folder in ns["PATH"]:
+        if folder != "parameters":
+            ns["PATH"][folder] = str(tmp_path / folder) + "/"
+            os.makedirs(ns["PATH"][folder], exist_ok = True)
+    exec(open("../code/setup.py").read(), ns)
+    exec(open("../code/functions.py").read(), ns)
+    return ns
+
+
+def grid_graph(ig, n):
+    """igraph path of n vertices, about 1 km apart, with the attributes of a loaded network."""
+    G = ig.Graph([(i, i + 1) for i in range(n - 1)])
+    G.vs["id"] = list(range(n))
+    G.vs["x"] = [12.5 + 0.015 * i for i in range(n)]
+    G.vs["y"] = [55.7] * n
+    G.es["weight"] = [1000.0] * (n - 1)
+    G.es["osmid"] = list(range(n - 1))
+    return G
+
+
+def lattice_graph(ig, n):
+    """igraph n x n grid, with vertices about 1 km apart and the attributes of a loaded network."""
+    G = ig.Graph.Lattice([n, n], circular = False)
+    G.vs["id"] = list(range(n * n))
+    G.vs["x"] = [12.5 + 0.015 * (i % n) for i in range(n * n)]
+    G.vs["y"] = [55.7 + 0.0089 * (i // n) for i in range(n * n)]
+    G.es["weight"] = [1000.0] * G.ecount()
+    G.es["osmid"] = list(range(G.ecount()))
+    return G
+
+
+def test_backfill_coverage(ns, monkeypatch):
+    ig = ns["ig"]
+    G_carall = grid_graph(ig, 5)
+    GTs = [grid_graph(ig, 3), grid_graph(ig, 5)]
+    res = {"GTs": GTs, "GT_abstracts": GTs, "prune_quantiles": [0.5, 1], "MST": GTs[1], "MST_abstract": GTs[1]}
+    merged, ingested = [], []
+    monkeypatch.setitem(ns, "csv_to_ig", lambda *args, **kwargs: G_carall)
+    monkeypatch.setitem(ns, "load_result_growth", lambda *args, **kwargs: res)
+    monkeypatch.setitem(ns, "load_pois", lambda *args, **kwargs: [0, 2, 4])
+    monkeypatch.setitem(ns, "merge_result_columns", lambda output, filepath: merged.append(output))
+    monkeypatch.setitem(ns, "ingest_results", lambda output, *args, **kwargs: ingested.append(output))
+
+    output, output_MST = ns["backfill_metrics"]("testcity", "grid", "betweenness", ["coverage", "poi_coverage"], workers = 1)
+
+    assert list(output) == ["coverage", "poi_coverage"]
+    assert 0 < output["coverage"][0] < output["coverage"][1]
+    assert output["poi_coverage"] == [2, 3]
+    assert output_MST["coverage"] == pytest.approx(output["coverage"][1])
+    assert output_MST["poi_coverage"] == 3
+    assert merged == [output, output_MST] and ingested == [output, output_MST]
+
+
+def test_backfill_directness_parallel(ns, monkeypatch):
+    ig = ns["ig"]
+    G_carall = lattice_graph(ig, 4)
+    # The second network has two components, so directness_lcc_linkwise and directness_all_linkwise differ
+    GTs = [G_carall.induced_subgraph(vertices) for vertices in [[0, 1, 2, 5, 6], [0, 1, 4, 5, 14, 15], list(range(16))]]
+    res = {"GTs": GTs, "GT_abstracts": GTs, "prune_quantiles": [0.25, 0.5, 1], "MST": GTs[2], "MST_abstract": GTs[2]}
+    monkeypatch.setitem(ns, "csv_to_ig", lambda *args, **kwargs: G_carall)
+    monkeypatch.setitem(ns, "load_result_growth", lambda *args, **kwargs: res)
+    monkeypatch.setitem(ns, "merge_result_columns", lambda output, filepath: None)
+    monkeypatch.setitem(ns, "ingest_results", lambda output, *args, **kwargs: None)
+    metrics = ["directness_lcc_linkwise", "directness_all_linkwise"]
+
+    # numnodepairs covers all vertices, so the sampled node pairs do not depend on the random state of the workers
+    output, output_MST = ns["backfill_metrics"]("testcity", "grid", "betweenness", metrics, numnodepairs = 100, workers = 3)
+    output_serial, output_MST_serial = ns["backfill_metrics"]("testcity", "grid", "betweenness", metrics, numnodepairs = 100, workers = 1)
+    expected = [ns["calculate_metrics"](G, G, G_carall, [], {metric: 0 for metric in metrics}, 500, 100, False, False) for G in GTs]
+
+    for metric in metrics:
+        assert output[metric] == pytest.approx(output_serial[metric])
+        assert output[metric] == pytest.approx([e[metric] for e in expected])
+        assert output_MST[metric] == pytest.approx(output_MST_serial[metric])
+        assert output_MST[metric] == pytest.approx(expected[2][metric])
+    assert all([0 < d <= 1 for metric in metrics for d in output[metric]])
+    assert output["directness_lcc_linkwise"][1] != pytest.approx(output["directness_all_linkwise"][1])